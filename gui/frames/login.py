@@ -38,7 +38,7 @@ class LoginFrame(customtkinter.CTkFrame):
         self.screenshot_label = customtkinter.CTkLabel(self, text="Screenshot mode:", font=customtkinter.CTkFont(size=20))
         self.screenshot_label.grid(row=3, column=0, padx=20, pady=(20, 10))
 
-        self.screenshot_dropdown = customtkinter.CTkOptionMenu(self, values=["SCREENCAP_PNG", "SCREENCAP_RAW", "ASCREENCAP", "UIAUTOMATOR2"], command=lambda x, y=["login", "screenshot_mode"]: self.config.save_to_json(y))
+        self.screenshot_dropdown = customtkinter.CTkOptionMenu(self, values=["AUTO", "SCREENCAP_PNG", "SCREENCAP_RAW", "SCREENCAP_STREAM", "ASCREENCAP", "UIAUTOMATOR2"], command=lambda x, y=["login", "screenshot_mode"]: self.config.save_to_json(y))
         self.screenshot_dropdown.grid(row=3, column=1, padx=20, pady=(20, 10))
 
         self.linker.widgets["login"]["screenshot_mode"] = self.screenshot_dropdown
@@ -90,7 +90,7 @@ class LoginFrame(customtkinter.CTkFrame):
         self.emulator_path_button.grid(row=9, column=2, padx=20, pady=(20, 10), sticky="nsew")
 
         self.delay_label = customtkinter.CTkLabel(self, text="Delay time (s)", font=customtkinter.CTkFont(size=20, family="Inter", underline=True))
-        self.delay_tooltip = CTkToolTip(self.delay_label, message="The time for the script to wait after launching the emulator", wraplength=400)
+        self.delay_tooltip = CTkToolTip(self.delay_label, message="The longest time to wait for the emulator to boot after launching it. The script continues as soon as the emulator is ready.", wraplength=400)
         self.delay_label.grid(row=10, column=0, padx=20, pady=(20, 10))
 
         self.delay_spinbox = CTkIntegerSpinbox(self, step_size=1, min_value=0, command=lambda x=["login", "delay"]:self.config.save_to_json(x))
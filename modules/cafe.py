@@ -1,6 +1,6 @@
 from util.logger import Logger
 from util.utils import Utils, Region, GoTo
-from tqdm import tqdm
+from util.bubbles import BubbleDetector
 
 class CafeModule(object):
     def __init__(self, config):
@@ -11,6 +11,7 @@ class CafeModule(object):
         """
         self.enabled = True
         self.config = config
+        self.max_tap_rounds = 5
         
         # Define regions for various elements on the screen
         self.region = {
@@ -29,19 +30,9 @@ class CafeModule(object):
 
         # Tap on students if the configuration allows
         if self.config.cafe['tap_students']:
-            # Define ranges for tapping students in a grid
-            y_range = range(140, 543, 50)
-            x_range = range(0, 1365, 50)
-            total_iterations = len(y_range) * len(x_range)
-            
-            # Create a progress bar for tapping students
-            progress_bar = tqdm(total=total_iterations, unit="taps", colour='cyan', desc='Tapping Students')
-            
-            # Loop through the grid and tap on students
-            for y in y_range:
-                for x in x_range:
-                    Utils.touch(x, y)
-                    progress_bar.update(1)  # Increment the progress bar
+            # the bubble detector is not calibrated against recorded frames yet, so it is opt-in
+            if not self.config.cafe.get('detect_bubbles', False) or not self.tap_students():
+                self.tap_grid()
 
         # Claim earnings if the configuration allows
         if self.config.cafe['claim_earnings']:
@@ -56,6 +47,38 @@ class CafeModule(object):
         # Return to the home screen
         GoTo.home()
 
+    def tap_grid(self):
+        """Taps the whole room in a grid, reaching every student whether it shows a bubble or not."""
+        # Define ranges for tapping students in a grid
+        y_range = range(140, 543, 50)
+        x_range = range(0, 1365, 50)
+
+        # Send the whole grid to the device in one batch
+        Logger.log_msg('Tapping students...')
+        Utils.batch_input([('tap', x, y) for y in y_range for x in x_range])
+
+    def tap_students(self):
+        """Taps the students showing an interaction bubble, until no bubble is left.
+
+        Returns:
+            bool: False if no bubble was found at all, so that the caller can fall back to the grid.
+        """
+        tapped = 0
+        for attempt in range(self.max_tap_rounds):
+            Utils.wait_update_screen(1)
+            bubbles = BubbleDetector.find(Utils.color_screen)
+            if not bubbles:
+                if attempt == 0:
+                    Logger.log_warning('No bubble detected, tapping the whole room instead.')
+                    return False
+                break
+            Utils.batch_input(BubbleDetector.taps(bubbles), delay=0.3)
+            tapped += len(bubbles)
+        else:
+            Logger.log_warning('Some bubbles are still shown after {} rounds of taps.'.format(self.max_tap_rounds))
+        Logger.log_msg('Tapped {} students.'.format(tapped))
+        return True
+
     def find_student(self):
         found = False
         last_student = ""
@@ -1,6 +1,5 @@
 from util.logger import Logger
 from util.utils import Utils, Region, GoTo
-from tqdm import tqdm
 import re
 
 class TacticalChallengeModule(object):
@@ -121,6 +120,7 @@ class TacticalChallengeModule(object):
 
     def progress_bar(self, total):
         # Display a progress bar while waiting
+        from tqdm import tqdm
         with tqdm(total=total, ncols=100, bar_format='{l_bar}{bar}{n_fmt}/{total_fmt}s', desc='Waiting Standby Time', colour='cyan') as pbar:
             for i in range(total):
                 pbar.update(1)
@@ -6,19 +6,23 @@ import os
 import subprocess
 import time
 
+start_time = time.perf_counter()
+
 try:
-    from modules.login import LoginModule
-    from modules.cafe import CafeModule
-    from modules.bounty import BountyModule
-    from modules.scrimmage import ScrimmageModule
-    from modules.mission import MissionModule
-    from modules.tactical_challenge import TacticalChallengeModule
-    from modules.claim_rewards import ClaimRewardsModule
     from util.adb import Adb
     from util.config import Config
     from util.logger import Logger
     from util.utils import Utils
+    from util.templates import Templates
+    from util.roi import RoiIndex
+    from util.probes import PixelProbes
+    from util.sleep_policy import SleepPolicy
+    from util.game_watcher import GameWatcher
+    from util.startup import Startup
     from util.exceptions import GameStuckError, GameNotRunningError, ReadOCRError
+    Startup.begin(start_time)
+    Startup.record('imports', time.perf_counter() - start_time)
+
     class BAAuto(object):
         modules = {
             'login': None,
@@ -33,25 +37,33 @@ try:
 
         def __init__(self, config):
             """Initializes the primary azurlane-auto instance with the passed in
-            Config instance; 
+            Config instance; task modules are imported only when enabled,
+            to keep the startup short.
 
             Args:
                 config (Config): BAAuto Config instance
             """
             self.config = config
             if self.config.login['enabled']:
+                from modules.login import LoginModule
                 self.modules['login'] = LoginModule(self.config)
             if self.config.cafe['enabled']:
+                from modules.cafe import CafeModule
                 self.modules['cafe'] = CafeModule(self.config)
             if self.config.farming['enabled'] and self.config.bounty['enabled']:
+                from modules.bounty import BountyModule
                 self.modules['bounty'] = BountyModule(self.config)
             if self.config.farming['enabled'] and self.config.scrimmage['enabled']:
+                from modules.scrimmage import ScrimmageModule
                 self.modules['scrimmage'] = ScrimmageModule(self.config)
             if self.config.farming['enabled'] and self.config.mission['enabled']:
+                from modules.mission import MissionModule
                 self.modules['mission'] = MissionModule(self.config)
             if self.config.farming['enabled'] and self.config.tactical_challenge['enabled']:
+                from modules.tactical_challenge import TacticalChallengeModule
                 self.modules['tactical_challenge'] = TacticalChallengeModule(self.config)
             if self.config.claim_rewards['enabled']:
+                from modules.claim_rewards import ClaimRewardsModule
                 self.modules['claim_rewards'] = ClaimRewardsModule(self.config)
                 
         def run_login_cycle(self):
@@ -140,31 +152,45 @@ try:
     Adb.tcp = False if (Adb.service.find(':') == -1) else True
     adb = Adb()
 
+    # the OCR models and templates do not need the device, load them while connecting to it
+    Utils.assets = config.assets
+    Startup.start('ocr', Utils.init_ocr_mode, True)
+    Startup.start('templates', Templates.preload, config.assets)
+
     def start_adb():
-        if adb.init():
+        if Startup.timed('adb', adb.init):
             Logger.log_msg('Successfully connected to the service with transport_id({}).'.format(Adb.transID))
-            output = Adb.exec_out('wm size').decode('utf-8').strip()
+            Startup.start('resolution', Adb.exec_out, 'wm size')
+            Startup.start('package', Adb.exec_out, 'pm path com.nexon.bluearchive')
+            # screencap init
+            Startup.start('screencap', Utils.init_screencap_mode, config.screenshot_mode)
+            output = Startup.result('resolution').decode('utf-8').strip()
 
             if not re.search('1280x720|1280x720', output):
                 Logger.log_error("Resolution is not 1280x720, please change it.")
                 terminate()
 
-            if 'com.nexon.bluearchive' not in Adb.u2device.app_list():
+            if not Startup.result('package').strip().startswith(b'package:'):
                 Logger.log_error("Blue Archive is not installed. Unable to run script.")
                 terminate()     
 
-            Utils.assets = config.assets
-            # screencap init
-            Utils.init_screencap_mode(config.screenshot_mode)
-            Utils.init_ocr_mode(EN=True)
+            Startup.result('screencap')
+            if config.prefetch_frames:
+                Utils.start_prefetcher()
+            if config.game_status_interval:
+                GameWatcher.start(config.game_status_interval)
+            Startup.result('ocr')
+            Startup.result('templates')
             Utils.record['restart_attempts'] = config.restart_attempts
+            Startup.report({'adb': Adb.phases, 'emulator': Adb.boot_phases})
         else:
             if config.login["launch_emulator"]:
                 emulator_path = config.login["emulator_path"]
                 if os.path.isfile(emulator_path):
                     process = subprocess.Popen(emulator_path, shell=True)
-                    Logger.log_info(f"Waiting {config.login['delay']} seconds after launching emulator...")
-                    time.sleep(config.login["delay"])
+                    Logger.log_info(f"Waiting up to {config.login['delay']} seconds for the emulator to boot...")
+                    if not Startup.timed('emulator', adb.wait_for_boot, config.login["delay"]):
+                        Logger.log_warning("Emulator did not finish booting in time, trying to connect anyway...")
                     config.login["launch_emulator"] = False
                     start_adb()
                     return
@@ -259,4 +285,8 @@ while counter != len(run_cycles):
         counter += 1
         task_started = False
 
+RoiIndex.report()
+PixelProbes.report()
+Utils.wait_report()
+SleepPolicy.report()
 Logger.log_info("All assigned tasks were executed.")
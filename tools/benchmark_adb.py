@@ -0,0 +1,64 @@
+"""Compares the per-command latency of running a command with the adb
+binary, with a new AdbClient stream per command and with the persistent
+AdbSession.
+
+Every command is run --runs times each way and the median and 90th
+percentile latencies are printed. The device must be connected to the adb
+server already.
+
+Usage: python tools/benchmark_adb.py --device 127.0.0.1:5555 [--runs 20]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util.adb import Adb
+
+COMMANDS = ['echo ok', 'getprop ro.build.version.sdk', 'wm size', 'screencap']
+
+
+def binary_exec_out(command):
+    cmd = ['adb', '-t', Adb.transID, 'exec-out'] + command.split(' ')
+    return subprocess.run(cmd, stdout=subprocess.PIPE).stdout
+
+
+def measure(function, command, runs):
+    latencies = []
+    for i in range(runs):
+        start_time = time.perf_counter()
+        function(command)
+        latencies.append(time.perf_counter() - start_time)
+    return numpy.median(latencies) * 1000, numpy.percentile(latencies, 90) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', required=True, help='serial or address of the device, as in adb devices -l')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    Adb.service = args.device
+    Adb.assign_serial()
+    if not Adb.transID:
+        sys.exit('Device {} is not connected to the adb server'.format(args.device))
+
+    print('{:32} {:>15} {:>15} {:>15}'.format('command', 'binary p50/p90', 'stream p50/p90', 'session p50/p90'))
+    for command in COMMANDS:
+        results = [measure(binary_exec_out, command, args.runs)]
+        Adb.persistent_shell = False
+        results.append(measure(Adb.exec_out, command, args.runs))
+        Adb.persistent_shell = True
+        # the first command opens the session, keep it out of the numbers
+        Adb.exec_out('true')
+        results.append(measure(Adb.exec_out, command, args.runs))
+        print('{:32} {}'.format(command, ' '.join('{:7.1f}/{:7.1f}'.format(*result) for result in results)))
+    print('\n{} session commands, {} reconnections'.format(Adb.session.commands, Adb.session.reconnects))
+
+
+if __name__ == '__main__':
+    main()
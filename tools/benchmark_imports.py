@@ -0,0 +1,92 @@
+"""Measures the time script.py spends importing modules before it starts.
+
+The modules script.py imports at its top level are imported --runs times in
+a new interpreter with -X importtime. The median time of the imports and
+the slowest modules of the last run are printed. The script exits with
+status 1 when the median is over --budget milliseconds, or when a module
+that must only be imported at first use is imported at startup.
+
+Usage: python tools/benchmark_imports.py [--budget 500] [--runs 5] [--top 15]
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+import numpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# modules only some runs need, imported where they are used
+DEFERRED = ['lz4', 'imutils', 'pponnxcr', 'tqdm', 'scipy', 'modules']
+
+
+def startup_imports():
+    """Returns the modules script.py imports outside of functions and classes."""
+    with open(os.path.join(ROOT, 'script.py'), 'r') as script:
+        tree = ast.parse(script.read())
+    names = []
+    nodes = list(tree.body)
+    while nodes:
+        node = nodes.pop(0)
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            names.append(node.module)
+        elif isinstance(node, ast.Try):
+            nodes = node.body + nodes
+    return names
+
+
+def measure(names):
+    """Imports names in a new interpreter.
+
+    Returns:
+        tuple: seconds spent importing, and (module, cumulative microseconds)
+            of every module imported.
+    """
+    code = 'import time; start_time = time.perf_counter(); import {}; print(time.perf_counter() - start_time)'.format(
+        ', '.join(names))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if process.returncode != 0:
+        sys.exit(process.stderr)
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, module = line[len('import time:'):].split('|')
+        modules.append((module.strip(), int(cumulative)))
+    return float(process.stdout.strip()), modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, default=500, help='milliseconds the imports may take')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='number of slowest modules to print')
+    args = parser.parse_args()
+
+    names = startup_imports()
+    timings = []
+    for i in range(args.runs):
+        elapsed_time, modules = measure(names)
+        timings.append(elapsed_time)
+
+    print('{:50} {:>10}'.format('module', 'cumulative'))
+    for module, cumulative in sorted(modules, key=lambda item: item[1], reverse=True)[:args.top]:
+        print('{:50} {:8.1f}ms'.format(module, cumulative / 1000))
+
+    median = numpy.median(timings) * 1000
+    print('\nImports took {:.1f} ms (median of {} runs), budget {:.0f} ms'.format(median, args.runs, args.budget))
+    failed = median > args.budget
+    eager = sorted(set(module for module, cumulative in modules
+                       if module.split('.')[0] in DEFERRED))
+    if eager:
+        print('Imported at startup but should be deferred: {}'.format(', '.join(eager)))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Benchmarks Utils.filter_similar_coords on synthetic match maps.
+
+Every heatmap is noise with a few bright peaks, thresholded the way find_all
+thresholds a real match map, so the filter receives the same dense clusters
+of raw hits. When scipy is installed the result is also compared with the
+previous cKDTree based filter.
+
+Usage: python tools/benchmark_nms.py [--maps 20] [--peaks 12] [--threshold 0.9]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util.logger import Logger
+from util.utils import Utils
+
+
+def synthetic_hits(rng, peaks, threshold):
+    heatmap = rng.random((690, 1220), dtype=numpy.float32) * 0.3
+    spots = numpy.zeros_like(heatmap)
+    for i in range(peaks):
+        spots[rng.integers(0, 690), rng.integers(0, 1220)] = 1
+    # spread every peak like the correlation of a template spreads around its match
+    spots = cv2.GaussianBlur(spots, (0, 0), 6)
+    heatmap += spots / spots.max()
+    rows, columns = numpy.where(heatmap >= threshold)
+    return list(zip(columns, rows))
+
+
+def reference(coords, distance):
+    from scipy import spatial
+    filtered_coords = []
+    if len(coords) > 0:
+        filtered_coords.append(coords[0])
+        for coord in coords:
+            if spatial.cKDTree(filtered_coords).query(coord)[0] > distance:
+                filtered_coords.append(coord)
+    return filtered_coords
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--maps', type=int, default=20)
+    parser.add_argument('--peaks', type=int, default=12)
+    parser.add_argument('--threshold', type=float, default=0.9)
+    parser.add_argument('--distance', type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        import scipy
+        compare = True
+    except ImportError:
+        compare = False
+        print('scipy is not installed, skipping the comparison with the cKDTree filter')
+
+    Logger.log_debug = lambda message: None
+    rng = numpy.random.default_rng(0)
+    total_hits = total_time = reference_time = 0
+    mismatches = 0
+    for i in range(args.maps):
+        coords = synthetic_hits(rng, args.peaks, args.threshold)
+        total_hits += len(coords)
+        start_time = time.perf_counter()
+        filtered = Utils.filter_similar_coords(coords, args.distance)
+        total_time += time.perf_counter() - start_time
+        if compare:
+            start_time = time.perf_counter()
+            expected = reference(coords, args.distance)
+            reference_time += time.perf_counter() - start_time
+            if [tuple(coord) for coord in filtered] != [tuple(coord) for coord in expected]:
+                mismatches += 1
+
+    print('{} maps, {:.0f} raw hits per map on average'.format(args.maps, total_hits / args.maps))
+    print('vectorised filter: {:8.2f} ms per map'.format(total_time * 1000 / args.maps))
+    if compare:
+        print('cKDTree filter:    {:8.2f} ms per map ({:.1f}x)'.format(
+            reference_time * 1000 / args.maps, reference_time / max(total_time, 1e-9)))
+        print('maps with a different result: {}'.format(mismatches))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Benchmarks PyramidMatcher against the exact full resolution matcher.
+
+For every template of a server, both matchers search each frame and the
+report shows their timings and whether they agree. Frames are the PNG
+screenshots of --frames when given, otherwise synthetic frames with the
+template pasted at a random position over noise.
+
+Usage: python tools/benchmark_pyramid.py [--server EN] [--frames DIR] [--similarity 0.9]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util.pyramid import PyramidMatcher
+from util.templates import Templates
+
+
+def template_names(server):
+    root = 'assets/{}'.format(server)
+    for path in sorted(glob.glob(os.path.join(root, '**', '*.png'), recursive=True)):
+        yield os.path.relpath(path, root)[:-4].replace(os.sep, '/')
+
+
+def synthetic_frames(template, count, rng):
+    height, width = template.shape[:2]
+    for i in range(count):
+        frame = rng.integers(0, 256, (720, 1280), dtype=numpy.uint8)
+        frame = cv2.GaussianBlur(frame, (5, 5), 0)
+        x, y = rng.integers(0, 1280 - width), rng.integers(0, 720 - height)
+        frame[y:y + height, x:x + width] = template
+        yield frame
+
+
+def exact(frame, template):
+    match = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+    value, location = cv2.minMaxLoc(match)[1], cv2.minMaxLoc(match)[3]
+    return value, location
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server', default='EN')
+    parser.add_argument('--frames', help='directory of recorded 1280x720 screenshots')
+    parser.add_argument('--similarity', type=float, default=0.9)
+    parser.add_argument('--synthetic', type=int, default=5, help='synthetic frames per template')
+    args = parser.parse_args()
+
+    recorded = []
+    if args.frames:
+        recorded = [cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                    for path in sorted(glob.glob(os.path.join(args.frames, '*.png')))]
+    rng = numpy.random.default_rng(0)
+
+    print('{:40} {:>9} {:>9} {:>8} {:>7}'.format('template', 'exact ms', 'pyramid', 'speedup', 'agree'))
+    safe = []
+    for name in template_names(args.server):
+        template = Templates.gray(args.server, name)
+        small_template = Templates.resized(args.server, name, PyramidMatcher.scale)
+        if not PyramidMatcher.usable(small_template):
+            print('{:40} too small for the coarse level'.format(name))
+            continue
+        frames = recorded or list(synthetic_frames(template, args.synthetic, rng))
+        exact_time = pyramid_time = 0
+        agreements = 0
+        for frame in frames:
+            (value, location), elapsed = timed(exact, frame, template)
+            exact_time += elapsed
+            small_frame = PyramidMatcher.downscale(frame)
+            (pyramid_value, pyramid_location), elapsed = timed(
+                PyramidMatcher.match_best, frame, small_frame, template, small_template, args.similarity)
+            pyramid_time += elapsed
+            found, pyramid_found = value >= args.similarity, pyramid_value >= args.similarity
+            if found == pyramid_found and (not found or (abs(location[0] - pyramid_location[0]) <= 2 and
+                                                         abs(location[1] - pyramid_location[1]) <= 2)):
+                agreements += 1
+        if agreements == len(frames):
+            safe.append(name)
+        print('{:40} {:9.2f} {:9.2f} {:7.1f}x {:4}/{}'.format(
+            name, exact_time * 1000 / len(frames), pyramid_time * 1000 / len(frames),
+            exact_time / max(pyramid_time, 1e-9), agreements, len(frames)))
+
+    print('\nTemplates that agreed on every frame:')
+    print(safe)
+
+
+if __name__ == '__main__':
+    main()
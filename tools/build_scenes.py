@@ -0,0 +1,81 @@
+"""Builds the SceneClassifier data from labelled screenshots.
+
+--frames must hold one directory per scene label, e.g. frames/home/*.png and
+frames/campaign/*.png. For every frame the whole screen signature is saved to
+cache/scenes.json, and the anchor template of its scene is searched so that
+the place of the anchor is learned into cache/roi_hints.json, which takes at
+least RoiIndex.min_hits frames per label. The frames are
+then classified with the anchors alone and the result is reported per label.
+
+Usage: python tools/build_scenes.py --frames DIR [--server EN] [--similarity 0.9]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util.cache import Cache
+from util.roi import RoiIndex
+from util.scene import SceneClassifier
+from util.templates import Templates
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', required=True, help='directory with one folder of 1280x720 screenshots per scene')
+    parser.add_argument('--server', default='EN')
+    parser.add_argument('--similarity', type=float, default=0.9)
+    args = parser.parse_args()
+
+    frames = []
+    for directory in sorted(glob.glob(os.path.join(args.frames, '*', ''))):
+        label = os.path.basename(os.path.dirname(directory))
+        if label not in SceneClassifier.anchors:
+            print('Skipping {}, it is not a scene label'.format(label))
+            continue
+        for path in sorted(glob.glob(os.path.join(directory, '*.png'))):
+            frames.append((label, os.path.basename(path), cv2.imread(path, cv2.IMREAD_COLOR)))
+    if not frames:
+        sys.exit('No labelled screenshots found in {}'.format(args.frames))
+
+    scenes = Cache.load('scenes', {})
+    recorded = scenes[args.server] = {}
+    for label, file, frame in frames:
+        signature = SceneClassifier.signature(frame, SceneClassifier.frame_signature_size)
+        if signature is not None:
+            recorded.setdefault(label, []).append([round(float(value), 5) for value in signature])
+        template = Templates.color(args.server, SceneClassifier.anchors[label])
+        match = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+        value, location = cv2.minMaxLoc(match)[1], cv2.minMaxLoc(match)[3]
+        if value >= args.similarity:
+            RoiIndex.learn(args.server, SceneClassifier.anchors[label], location[0], location[1],
+                           template.shape[1], template.shape[0])
+        else:
+            print('{}/{}: anchor {} not found ({:.3f})'.format(label, file, SceneClassifier.anchors[label], value))
+    Cache.save('scenes', scenes)
+
+    # classify with the anchors alone, the recorded frames would recognise themselves
+    SceneClassifier.recorded = {}
+    results = {}
+    elapsed_time = 0
+    for label, file, frame in frames:
+        start_time = time.perf_counter()
+        predicted, confidence = SceneClassifier.classify(args.server, frame)
+        elapsed_time += time.perf_counter() - start_time
+        results.setdefault(label, []).append(predicted)
+        if predicted != label:
+            print('{}/{}: classified as {} ({:.3f})'.format(label, file, predicted, confidence))
+
+    print('\n{:20} {:>7} {:>7} {:>7}'.format('scene', 'frames', 'right', 'unsure'))
+    for label, predictions in sorted(results.items()):
+        print('{:20} {:7} {:7} {:7}'.format(label, len(predictions), predictions.count(label),
+                                            predictions.count(None)))
+    print('\n{:.1f} us per classification'.format(elapsed_time * 1e6 / len(frames)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Runs the cafe BubbleDetector on recorded screenshots.
+
+Every PNG of --frames is searched for bubbles and the count and time are
+printed. With --labels, a JSON file mapping file names to the number of
+bubbles they show, the counts are checked and the script exits with status 1
+on any difference. With --out, the frames are written there with the room,
+the bubbles and the tap positions drawn on them, and the masks next to them.
+
+Usage: python tools/detect_bubbles.py --frames DIR [--labels labels.json] [--out DIR]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util.bubbles import BubbleDetector
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', required=True, help='directory of recorded 1280x720 cafe screenshots')
+    parser.add_argument('--labels', help='JSON file of the expected bubble count per file name')
+    parser.add_argument('--out', help='directory to write the annotated frames to')
+    args = parser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels, 'r') as json_file:
+            labels = json.load(json_file)
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+
+    paths = sorted(glob.glob(os.path.join(args.frames, '*.png')))
+    if not paths:
+        sys.exit('No PNG screenshots found in {}'.format(args.frames))
+    wrong = 0
+    elapsed_time = 0
+    for path in paths:
+        file = os.path.basename(path)
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        start_time = time.perf_counter()
+        boxes = BubbleDetector.find(frame)
+        elapsed_time += time.perf_counter() - start_time
+        line = '{:40} {:3} bubbles'.format(file, len(boxes))
+        if file in labels:
+            if labels[file] != len(boxes):
+                wrong += 1
+                line += ', expected {}'.format(labels[file])
+        print(line)
+
+        if args.out:
+            x, y, w, h = BubbleDetector.room
+            cv2.rectangle(frame, (x, y), (x + w - 1, y + h - 1), (255, 0, 0), 1)
+            for x, y, w, h in boxes:
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
+            for event in BubbleDetector.taps(boxes):
+                cv2.circle(frame, (event[1], event[2]), 5, (0, 255, 0), -1)
+            name = os.path.splitext(file)[0]
+            cv2.imwrite(os.path.join(args.out, name + '.png'), frame)
+            cv2.imwrite(os.path.join(args.out, name + '_mask.png'), BubbleDetector.mask(cv2.imread(path)))
+
+    print('\n{:.2f} ms per frame'.format(elapsed_time * 1000 / len(paths)))
+    if labels:
+        print('{} of {} labelled frames counted wrong'.format(wrong, len([p for p in paths if os.path.basename(p) in labels])))
+    sys.exit(1 if wrong else 0)
+
+
+if __name__ == '__main__':
+    main()
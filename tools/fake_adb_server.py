@@ -0,0 +1,174 @@
+"""Local stand-in for the ADB server, to exercise AdbClient, AdbSession and
+ScreenCapStream without a device.
+
+It lists one device and runs the commands it receives with the local sh,
+with the directory given by --bin first in PATH, so that scripts put there
+can play device commands such as screencap or getprop. As on a device, the
+raw shell merges stderr into stdout. With --no-shell-v2 the device behaves
+like adbd before Android 7: shell_v2 is missing from its features and
+shell,raw: streams are refused. Pushed files are written to --remote, a
+temporary directory by default.
+
+Usage: python tools/fake_adb_server.py [--port 15037] [--bin DIR] [--no-shell-v2]
+then run BAAuto or a tool with ANDROID_ADB_SERVER_PORT set to the port.
+"""
+import argparse
+import os
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+
+
+class FakeAdbServer(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.env = dict(os.environ, PATH=os.path.abspath(args.bin) + os.pathsep + os.environ['PATH'])
+        self.features = ['cmd', 'stat_v2', 'fixed_push_mkdir']
+        if not args.no_shell_v2:
+            self.features.append('shell_v2')
+
+    @staticmethod
+    def recv_exactly(sock, size):
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def read_request(self, sock):
+        return self.recv_exactly(sock, int(self.recv_exactly(sock, 4), 16)).decode('utf-8')
+
+    @staticmethod
+    def reply(sock, message):
+        data = message.encode('utf-8')
+        sock.sendall(b'OKAY' + b'%04x' % len(data) + data)
+
+    @staticmethod
+    def fail(sock, message):
+        data = message.encode('utf-8')
+        sock.sendall(b'FAIL' + b'%04x' % len(data) + data)
+
+    def is_device(self, device):
+        return device in (self.args.serial, str(self.args.transport_id))
+
+    def handle(self, sock):
+        try:
+            request = self.read_request(sock)
+            if request == 'host:version':
+                self.reply(sock, '0029')
+            elif request == 'host:devices-l':
+                self.reply(sock, '{}          device product:sdk model:fake transport_id:{}\n'.format(
+                    self.args.serial, self.args.transport_id))
+            elif request.startswith('host:connect:'):
+                self.reply(sock, 'already connected to ' + request[len('host:connect:'):])
+            elif request == 'host:kill':
+                sock.sendall(b'OKAY')
+            elif request.startswith(('host-serial:', 'host-transport-id:')) and request.endswith(':features'):
+                if self.is_device(request.split(':')[1]):
+                    self.reply(sock, ','.join(self.features))
+                else:
+                    self.fail(sock, 'device not found')
+            elif request.startswith(('host:transport:', 'host:transport-id:')):
+                if not self.is_device(request.rsplit(':', 1)[1]):
+                    self.fail(sock, 'device not found')
+                    return
+                sock.sendall(b'OKAY')
+                self.service(sock, self.read_request(sock))
+            else:
+                self.fail(sock, 'unknown request ' + request)
+        except EOFError:
+            pass
+        finally:
+            sock.close()
+
+    def service(self, sock, service):
+        if service == 'shell,raw:':
+            if self.args.no_shell_v2:
+                self.fail(sock, 'unknown service shell,raw:')
+                return
+            sock.sendall(b'OKAY')
+            self.raw_shell(sock)
+        elif service.startswith(('exec:', 'shell:')):
+            sock.sendall(b'OKAY')
+            command = service.split(':', 1)[1]
+            stderr = subprocess.STDOUT if service.startswith('shell:') else subprocess.DEVNULL
+            sock.sendall(subprocess.run(['sh', '-c', command], stdout=subprocess.PIPE, stderr=stderr,
+                                        env=self.env).stdout)
+        elif service == 'sync:':
+            sock.sendall(b'OKAY')
+            self.sync(sock)
+        else:
+            self.fail(sock, 'unknown service ' + service)
+
+    def raw_shell(self, sock):
+        process = subprocess.Popen(['sh'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, env=self.env, bufsize=0)
+
+        def pump():
+            while True:
+                data = process.stdout.read(1 << 16)
+                if not data:
+                    break
+                sock.sendall(data)
+            sock.close()
+
+        threading.Thread(target=pump, daemon=True).start()
+        try:
+            while True:
+                data = sock.recv(1 << 16)
+                if not data:
+                    break
+                process.stdin.write(data)
+        finally:
+            process.kill()
+
+    def sync(self, sock):
+        command, length = struct.unpack('<4sI', self.recv_exactly(sock, 8))
+        path, mode = self.recv_exactly(sock, length).decode('utf-8').rsplit(',', 1)
+        data = b''
+        while True:
+            command, length = struct.unpack('<4sI', self.recv_exactly(sock, 8))
+            if command != b'DATA':
+                break
+            data += self.recv_exactly(sock, length)
+        os.makedirs(self.args.remote, exist_ok=True)
+        local_path = os.path.join(self.args.remote, os.path.basename(path))
+        with open(local_path, 'wb') as local_file:
+            local_file.write(data)
+        os.chmod(local_path, int(mode) & 0o777)
+        sock.sendall(b'OKAY' + struct.pack('<I', 0))
+        self.recv_exactly(sock, 8)
+
+    def serve(self):
+        server = socket.socket()
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(('127.0.0.1', self.args.port))
+        server.listen(50)
+        print('Fake ADB server listening on port {}'.format(self.args.port))
+        while True:
+            sock, address = server.accept()
+            # like the real server, do not delay small writes such as the session markers
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.handle, args=(sock,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=15037)
+    parser.add_argument('--bin', default='.', help='directory of scripts playing device commands')
+    parser.add_argument('--remote', default=os.path.join(tempfile.gettempdir(), 'baauto_fake_device'),
+                        help='directory receiving pushed files')
+    parser.add_argument('--serial', default='emulator-5554')
+    parser.add_argument('--transport-id', type=int, default=7)
+    parser.add_argument('--no-shell-v2', action='store_true', help='behave like adbd before Android 7')
+    args = parser.parse_args()
+    FakeAdbServer(args).serve()
+
+
+if __name__ == '__main__':
+    main()
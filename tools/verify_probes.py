@@ -0,0 +1,92 @@
+"""Verifies the PixelProbes signatures against recorded screenshots.
+
+For every frame of --frames and every probed template, the probe verdict is
+compared with a full screen template match. A probe that says present while
+the template is absent, or the other way round, is a disagreement and makes
+the script exit with status 1. Inconclusive probes are only counted, find
+falls back to template matching for them.
+
+With --learn, templates without a signature learn one from the first frame
+they are found in, and the signatures are saved to cache/probes.json.
+
+Usage: python tools/verify_probes.py --frames DIR [--server EN] [--learn] [--template goto/home]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util.probes import PixelProbes
+from util.templates import Templates
+
+
+def exact(frame, template, similarity):
+    match = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+    value, location = cv2.minMaxLoc(match)[1], cv2.minMaxLoc(match)[3]
+    return location if value >= similarity else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', required=True, help='directory of recorded 1280x720 screenshots')
+    parser.add_argument('--server', default='EN')
+    parser.add_argument('--similarity', type=float, default=0.9)
+    parser.add_argument('--learn', action='store_true', help='learn missing signatures from the frames')
+    parser.add_argument('--template', action='append', help='template to verify, defaults to every probed one')
+    args = parser.parse_args()
+
+    names = sorted(args.template or set(PixelProbes.templates) | set(PixelProbes.declared))
+    if not names:
+        sys.exit('No template is probed, pass the templates to verify with --template')
+    paths = sorted(glob.glob(os.path.join(args.frames, '*.png')))
+    frames = [(os.path.basename(path), cv2.imread(path, cv2.IMREAD_COLOR)) for path in paths]
+    if not frames:
+        sys.exit('No PNG screenshots found in {}'.format(args.frames))
+
+    print('{:28} {:>7} {:>7} {:>7} {:>7} {:>9} {:>9}'.format(
+        'template', 'agree', 'differ', 'unsure', 'no sig', 'probe us', 'match ms'))
+    disagreements = []
+    for name in names:
+        template = Templates.gray(args.server, name)
+        if template is None:
+            print('{:28} asset not found'.format(name))
+            continue
+        height, width = template.shape[:2]
+        counts = {'agree': 0, 'differ': 0, 'unsure': 0, 'missing': 0}
+        probe_time = match_time = 0
+        for file, frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            start_time = time.perf_counter()
+            location = exact(gray, template, args.similarity)
+            match_time += time.perf_counter() - start_time
+            if args.learn and location is not None:
+                PixelProbes.learn(args.server, name, frame, location[0], location[1], width, height)
+
+            start_time = time.perf_counter()
+            verdict, region = PixelProbes.check(args.server, name, frame)
+            probe_time += time.perf_counter() - start_time
+            if PixelProbes.signature(args.server, name) is None:
+                counts['missing'] += 1
+            elif verdict is None:
+                counts['unsure'] += 1
+            elif verdict == (location is not None):
+                counts['agree'] += 1
+            else:
+                counts['differ'] += 1
+                disagreements.append((name, file, 'present' if verdict else 'absent',
+                                      'present' if location is not None else 'absent'))
+        print('{:28} {:7} {:7} {:7} {:7} {:9.1f} {:9.2f}'.format(
+            name, counts['agree'], counts['differ'], counts['unsure'], counts['missing'],
+            probe_time * 1e6 / len(frames), match_time * 1000 / len(frames)))
+
+    for name, file, verdict, expected in disagreements:
+        print('{}: probes say {} on {}, template match says {}'.format(name, verdict, file, expected))
+    sys.exit(1 if disagreements else 0)
+
+
+if __name__ == '__main__':
+    main()
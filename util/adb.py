@@ -1,20 +1,171 @@
 import subprocess
+import time
 import uiautomator2 as u2
 from util.logger import Logger
+from util.adb_client import AdbClient
+from util.adb_session import AdbSession
 
 class Adb(object):
+    """Static front of the ADB commands BAAuto uses. Commands are sent to
+    the ADB server through AdbClient, the adb binary is only run to start
+    the server and wait for a device.
+    """
 
     legacy = False
     service = ''
+    # serial of the device as listed by the ADB server, service may only be part of it
+    serial = ''
     transID = ''
     tcp = False
     u2device = None
+    # serve shell and exec-out commands through one AdbSession instead of a stream per command
+    persistent_shell = True
+    session = None
+    # seconds spent in each phase of the last init, in order
+    phases = {}
+    # seconds spent in each phase of the last wait_for_boot, in order
+    boot_phases = {}
 
     def init(self):
-        """Kills and starts a new ADB server
+        """Attaches to the running ADB server and device, killing and starting
+        a new ADB server only if they fail their health check.
+
+        Returns:
+            (boolean): True if everything is ready, False otherwise.
+        """
+        Adb.phases = {}
+        ready = self.attach()
+        if not ready:
+            Logger.log_msg('ADB server or device not ready, restarting the ADB server...')
+            self.timed('kill-server', self.kill_server)
+            ready = self.start_server()
+        Logger.log_debug('ADB startup: ' + ', '.join(
+            '{} {:.2f}s'.format(phase, seconds) for phase, seconds in Adb.phases.items()))
+        return ready
+
+    def attach(self):
+        """Reuses the running ADB server, the transport of the device and the
+        uiautomator2 session, checking each of them answers. A uiautomator2
+        session that does not answer is connected again, restarting the ADB
+        server would not fix it and would drop its other clients.
+
+        Returns:
+            (boolean): True if the server and the transport are healthy, False otherwise.
+        """
+        try:
+            self.timed('server', AdbClient.version)
+        except Exception as e:
+            Logger.log_debug('ADB server is not running: {}'.format(e))
+            return False
+        if not self.timed('transport', self.probe_transport):
+            Logger.log_debug('Device [{}] is not attached to the ADB server.'.format(self.service))
+            return False
+        if self.timed('uiautomator2', self.connect_u2, self.tcp, True):
+            return True
+        Logger.log_warning('uiautomator2 did not answer, connecting it again...')
+        Adb.u2device = None
+        self.timed('uiautomator2', self.connect_u2, self.tcp)
+        return True
+
+    def probe_transport(self):
+        """Checks the device is listed by the ADB server and runs commands.
+
+        Returns:
+            (boolean): True if the device answered, False otherwise.
         """
-        self.kill_server()
-        return self.start_server() 
+        if self.tcp:
+            if not self.connect_tcp():
+                return False
+        else:
+            self.assign_serial()
+            if not self.transID:
+                return False
+        try:
+            return AdbClient.exec_out(self.transID, 'echo ok').strip() == b'ok'
+        except Exception as e:
+            Logger.log_debug('Device [{}] did not answer: {}'.format(self.service, e))
+            return False
+
+    def connect_u2(self, wifi, check=False):
+        """Connects uiautomator2 to the device, keeping the current session
+        if it still answers.
+
+        Args:
+            wifi (boolean): whether the device is connected over TCP.
+            check (boolean, optional): whether to check a new session answers.
+
+        Returns:
+            (boolean): True if the session is ready, False otherwise.
+        """
+        if Adb.u2device is not None and self.u2_healthy():
+            return True
+        if wifi:
+            Adb.u2device = u2.connect_adb_wifi(Adb.service)
+        else:
+            Adb.u2device = u2.connect_usb(Adb.service)
+        return self.u2_healthy() if check else True
+
+    def wait_for_boot(self, timeout, poll=1):
+        """Waits for a device that is starting, e.g. an emulator just launched:
+        first for its transport, then for sys.boot_completed, then for
+        uiautomator2 to answer.
+
+        Args:
+            timeout (float): seconds to wait for all of them.
+            poll (float, optional): seconds between two checks.
+
+        Returns:
+            (boolean): True as soon as the device is usable, False on timeout.
+        """
+        deadline = time.perf_counter() + timeout
+        Adb.boot_phases = {}
+        checks = [
+            ('transport', self.probe_transport),
+            ('boot_completed', self.boot_completed),
+            ('uiautomator2', lambda: self.connect_u2(self.tcp, True)),
+        ]
+        for phase, check in checks:
+            start_time = time.perf_counter()
+            while not self.try_check(check):
+                if time.perf_counter() >= deadline:
+                    Logger.log_warning('Device [{}] was not ready after {} seconds, still waiting for {}.'.format(
+                        self.service, timeout, phase))
+                    return False
+                time.sleep(poll)
+            Adb.boot_phases[phase] = time.perf_counter() - start_time
+            Logger.log_debug('Device [{}] {} ready after {:.2f}s.'.format(self.service, phase, Adb.boot_phases[phase]))
+        return True
+
+    def boot_completed(self):
+        return AdbClient.exec_out(self.transID, 'getprop sys.boot_completed').strip() == b'1'
+
+    @staticmethod
+    def try_check(check):
+        """Runs a readiness check, a device that is still starting may drop
+        the connection instead of answering."""
+        try:
+            return check()
+        except Exception as e:
+            Logger.log_debug('Device not ready: {}'.format(e))
+            return False
+
+    @staticmethod
+    def u2_healthy():
+        try:
+            Adb.u2device.info
+            return True
+        except Exception as e:
+            Logger.log_debug('uiautomator2 did not answer: {}'.format(e))
+            return False
+
+    @staticmethod
+    def timed(phase, function, *args):
+        """Runs function and records its duration under phase in Adb.phases."""
+        start_time = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            Adb.phases[phase] = Adb.phases.get(phase, 0) + time.perf_counter() - start_time
 
 
     def enable_legacy(self):
@@ -31,22 +182,18 @@ class Adb(object):
             (boolean): True if everything is ready, False otherwise.
         """
         cmd = ['adb', 'start-server']
-        subprocess.call(cmd)
+        self.timed('start-server', subprocess.call, cmd)
         """ hooking onto here, previous implementation of get-state
          is pointless since the script kills the ADB server in advance,
          now seperately connect via usb or tcp, tcp variable is set by main script"""
-        if self.tcp and self.connect_tcp():
-            Adb.u2device = u2.connect_adb_wifi(Adb.service)
-            return True
-        else:
-            if self.connect_usb():
-                Adb.u2device = u2.connect_usb(Adb.service)
-                return True
+        if self.tcp and self.timed('transport', self.connect_tcp):
+            return self.timed('uiautomator2', self.connect_u2, True)
+        elif self.timed('transport', self.connect_usb):
+            return self.timed('uiautomator2', self.connect_u2, False)
         return False
 
     def connect_tcp(self):
-        cmd = ['adb', 'connect', self.service]
-        response = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8')
+        response = AdbClient.connect_device(self.service)
         if (response.find('connected') == 0) or (response.find('already') == 0):
             self.assign_serial()
             if (self.transID is not None) and self.transID:
@@ -70,8 +217,17 @@ class Adb(object):
         """
         if Adb.u2device:
             Adb.u2device.disconnect()
-        cmd = ['adb', 'kill-server']
-        subprocess.call(cmd)
+        if Adb.session is not None:
+            Adb.session.close()
+            Adb.session = None
+        AdbClient.kill_server()
+
+    @staticmethod
+    def use_session():
+        """Whether commands go through the AdbSession. It needs a raw shell,
+        so devices without shell_v2 get an exec stream per command instead.
+        """
+        return Adb.persistent_shell and AdbClient.has_shell_v2(Adb.serial or Adb.transID)
 
     @staticmethod
     def exec_out(args):
@@ -83,9 +239,25 @@ class Adb(object):
         Returns:
             tuple: A tuple containing stdoutdata and stderrdata
         """
-        cmd = ['adb', '-t', Adb.transID , 'exec-out'] + args.split(' ')
-        process = subprocess.Popen(cmd, stdout = subprocess.PIPE)
-        return process.communicate()[0]
+        if Adb.use_session():
+            return Adb.get_session().run(args)
+        return AdbClient.exec_out(Adb.transID, args)
+
+    @staticmethod
+    def exec_out_into(args, buffer):
+        """Executes the command via exec-out and reads its output straight into
+        buffer, growing it only when the output does not fit.
+
+        Args:
+            args (string): Command to execute.
+            buffer (bytearray): Reusable buffer receiving stdout.
+
+        Returns:
+            int: Number of bytes read into buffer.
+        """
+        if Adb.use_session():
+            return Adb.get_session().run_into(args, buffer)
+        return AdbClient.exec_out_into(Adb.transID, args, buffer)
 
     @staticmethod
     def shell(args):
@@ -94,28 +266,57 @@ class Adb(object):
         Args:
             args (string): Command to execute.
         """
-        cmd = ['adb', '-t', Adb.transID ,'shell'] + args.split(' ')
-        Logger.log_debug(str(cmd))
-        subprocess.call(cmd)
+        if Adb.use_session():
+            Logger.log_debug('ADB session: {}'.format(args))
+            return Adb.get_session().run(args, stderr=True)
+        Logger.log_debug('ADB shell: stream: {}'.format(args))
+        return AdbClient.shell(Adb.transID, args)
 
     @staticmethod
     def cmd(args):
-        """Executes a general command of ADB
+        """Executes a general command of ADB. push and shell are served by
+        AdbClient, anything else runs the adb binary.
 
         Args:
             args (string): Command to execute.
         """
-        cmd = ['adb', '-t', Adb.transID] + args.split(' ')
+        words = args.split(' ')
+        if words[0] == 'shell' and len(words) > 1:
+            command = args.split(' ', 1)[1]
+            if Adb.use_session():
+                Logger.log_debug('ADB session: {}'.format(command))
+                return Adb.get_session().run(command)
+            Logger.log_debug('ADB exec: stream: {}'.format(command))
+            return AdbClient.exec_out(Adb.transID, command)
+        if words[0] == 'push' and len(words) == 3:
+            Logger.log_debug('ADB sync: push {} to {}'.format(words[1], words[2]))
+            AdbClient.push(Adb.transID, words[1], words[2])
+            return b''
+        cmd = ['adb', '-t', Adb.transID] + words
         Logger.log_debug(str(cmd))
         process = subprocess.Popen(cmd, stdout = subprocess.PIPE)
         return process.communicate()[0]
 
+    @staticmethod
+    def get_session():
+        """Returns the shell session of the current device, opening a new one
+        if the device changed.
+
+        Returns:
+            AdbSession: the session.
+        """
+        if Adb.session is None or Adb.session.transport_id != Adb.transID:
+            if Adb.session is not None:
+                Adb.session.close()
+            Adb.session = AdbSession(Adb.transID)
+        return Adb.session
+
     @classmethod
     def assign_serial(cls):
-        cmd = ['adb', 'devices', '-l']
-        response = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8').splitlines()
+        response = AdbClient.devices().splitlines()
         cls.sanitize_device_info(response)
         cls.transID = cls.get_serial_trans(cls.service, response)
+        cls.serial = next((line.split()[0] for line in response if cls.service in line), '')
 
     @staticmethod
     def sanitize_device_info(string_list):
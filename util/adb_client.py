@@ -0,0 +1,353 @@
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from util.logger import Logger
+
+class AdbStream(object):
+    """Socket attached to a service of a device, e.g. a shell, exposing the
+    few file methods the callers need.
+    """
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.closed = False
+
+    def write(self, data):
+        self.socket.sendall(data)
+
+    def readinto(self, view):
+        """Reads what is available into view, returns 0 at the end of the stream."""
+        count = self.socket.recv_into(view)
+        if not count:
+            self.closed = True
+        return count
+
+    def read_all(self):
+        """Reads until the device closes the stream."""
+        chunks = []
+        while True:
+            chunk = self.socket.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.close()
+        return b''.join(chunks)
+
+    def read_all_into(self, buffer):
+        """Reads until the device closes the stream into buffer, growing it
+        only when the output does not fit.
+
+        Returns:
+            int: Number of bytes read into buffer.
+        """
+        read = 0
+        while True:
+            if read == len(buffer):
+                buffer.extend(bytes(max(len(buffer), 1 << 20)))
+            with memoryview(buffer) as view:
+                count = self.readinto(view[read:])
+            if not count:
+                break
+            read += count
+        self.close()
+        return read
+
+    def close(self):
+        self.closed = True
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+class AdbClient(object):
+    """Client of the ADB server speaking its socket protocol, so that a
+    command costs a local connection instead of starting the adb binary.
+
+    Streams of a device are opened from sockets already attached to its
+    transport, `pool_size` of which are kept ready per device.
+    """
+
+    host = '127.0.0.1'
+    port = int(os.environ.get('ANDROID_ADB_SERVER_PORT', 5037))
+    connect_timeout = 5
+    pool_size = 2
+    # bytes per DATA packet of a sync push, the protocol maximum
+    sync_chunk = 64 * 1024
+
+    pools = {}
+    # devices whose pool is being refilled, one refill runs at a time per device
+    refilling = set()
+    lock = threading.Lock()
+    # device: set of the features its adbd supports, e.g. 'shell_v2'
+    feature_sets = {}
+
+    @classmethod
+    def connect(cls):
+        """Opens a connection to the ADB server."""
+        sock = socket.create_connection((cls.host, cls.port), timeout=cls.connect_timeout)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def recv_exactly(sock, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('ADB server closed the connection')
+            data += chunk
+        return bytes(data)
+
+    @classmethod
+    def read_message(cls, sock):
+        """Reads a message prefixed by its length in 4 hex digits."""
+        length = int(cls.recv_exactly(sock, 4), 16)
+        return cls.recv_exactly(sock, length)
+
+    @classmethod
+    def request(cls, sock, request):
+        """Sends a request and checks the server accepted it.
+
+        Args:
+            sock (socket): connection to the ADB server.
+            request (string): e.g. 'host:version' or 'shell:ls'.
+        """
+        data = request.encode('utf-8')
+        sock.sendall(b'%04x' % len(data) + data)
+        status = cls.recv_exactly(sock, 4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise Exception('ADB request {} failed: {}'.format(
+                request, cls.read_message(sock).decode('utf-8', 'replace')))
+        raise Exception('ADB request {} got an unexpected reply: {}'.format(request, status))
+
+    @classmethod
+    def host_request(cls, request):
+        """Sends a host request answering with a message and returns the message."""
+        with cls.connect() as sock:
+            cls.request(sock, request)
+            return cls.read_message(sock).decode('utf-8', 'replace')
+
+    @classmethod
+    def version(cls):
+        """Returns the protocol version of the ADB server, raises if it is not running."""
+        return int(cls.host_request('host:version'), 16)
+
+    @classmethod
+    def devices(cls):
+        """Returns the output of `adb devices -l`, without its title line."""
+        return cls.host_request('host:devices-l')
+
+    @classmethod
+    def connect_device(cls, address):
+        """Connects the ADB server to a device over TCP, like `adb connect`.
+
+        Returns:
+            string: answer of the server, e.g. 'connected to 127.0.0.1:5555'.
+        """
+        return cls.host_request('host:connect:{}'.format(address))
+
+    @classmethod
+    def features(cls, device):
+        """Returns the features of a device, like `adb features`. They are
+        asked once per device, an empty set is returned if the server does
+        not know them.
+
+        Args:
+            device (string): transport id or serial of the device.
+
+        Returns:
+            set: names of the features.
+        """
+        if device not in cls.feature_sets:
+            if str(device).isdigit():
+                request = 'host-transport-id:{}:features'.format(device)
+            else:
+                request = 'host-serial:{}:features'.format(device)
+            try:
+                features = set(cls.host_request(request).strip().split(','))
+            except Exception as e:
+                Logger.log_debug('Unable to read the features of {}: {}'.format(device, e))
+                features = set()
+            features.discard('')
+            Logger.log_debug('Features of {}: {}'.format(device, ', '.join(sorted(features)) or 'none'))
+            cls.feature_sets[device] = features
+        return cls.feature_sets[device]
+
+    @classmethod
+    def has_shell_v2(cls, device):
+        """Whether the device accepts shell,raw: streams, whose output is not
+        mangled by a terminal. adbd only supports them from Android 7.
+        """
+        return 'shell_v2' in cls.features(device)
+
+    @classmethod
+    def kill_server(cls):
+        """Stops the ADB server if it is running, like `adb kill-server`."""
+        cls.clear_pools()
+        cls.feature_sets = {}
+        try:
+            with cls.connect() as sock:
+                cls.request(sock, 'host:kill')
+        except (ConnectionError, OSError):
+            pass
+
+    @staticmethod
+    def transport_request(device):
+        """Returns the request selecting a device by transport id or by serial."""
+        if str(device).isdigit():
+            return 'host:transport-id:{}'.format(device)
+        return 'host:transport:{}'.format(device)
+
+    @classmethod
+    def attach(cls, device):
+        """Opens a connection attached to the transport of the device."""
+        sock = cls.connect()
+        try:
+            cls.request(sock, cls.transport_request(device))
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    @classmethod
+    def open(cls, device, service):
+        """Opens a stream to a service of the device, e.g. 'shell:ls' or
+        'exec:screencap', from a pre-attached connection when one is ready.
+
+        Args:
+            device (string): transport id or serial of the device.
+            service (string): service request.
+
+        Returns:
+            AdbStream: the stream.
+        """
+        with cls.lock:
+            pool = cls.pools.setdefault(device, deque())
+            sock = pool.popleft() if pool else None
+        if sock is not None:
+            try:
+                cls.request(sock, service)
+                cls.refill(device)
+                return AdbStream(sock)
+            except (ConnectionError, OSError):
+                # the server dropped the pooled connection, e.g. after a restart
+                sock.close()
+            except Exception:
+                sock.close()
+                raise
+        sock = cls.attach(device)
+        try:
+            cls.request(sock, service)
+        except Exception:
+            sock.close()
+            raise
+        cls.refill(device)
+        return AdbStream(sock)
+
+    @classmethod
+    def refill(cls, device):
+        """Attaches connections to the device in the background until its
+        pool is full, unless a refill of the device is already running."""
+        with cls.lock:
+            if device in cls.refilling or len(cls.pools.get(device, ())) >= cls.pool_size:
+                return
+            cls.refilling.add(device)
+
+        def fill():
+            try:
+                while True:
+                    with cls.lock:
+                        if len(cls.pools.get(device, ())) >= cls.pool_size:
+                            return
+                    sock = cls.attach(device)
+                    with cls.lock:
+                        pool = cls.pools.setdefault(device, deque())
+                        # the pools may have been cleared and refilled meanwhile
+                        full = len(pool) >= cls.pool_size
+                        if not full:
+                            pool.append(sock)
+                    if full:
+                        sock.close()
+                        return
+            except Exception as e:
+                Logger.log_debug('Unable to attach a connection to {}: {}'.format(device, e))
+            finally:
+                with cls.lock:
+                    cls.refilling.discard(device)
+        threading.Thread(target=fill, daemon=True).start()
+
+    @classmethod
+    def clear_pools(cls):
+        """Closes every pre-attached connection."""
+        with cls.lock:
+            pools, cls.pools = cls.pools, {}
+        for pool in pools.values():
+            for sock in pool:
+                sock.close()
+
+    @classmethod
+    def exec_out(cls, device, command):
+        """Runs a command with the exec service, which passes its stdout untouched.
+
+        Returns:
+            bytes: stdout of the command.
+        """
+        return cls.open(device, 'exec:{}'.format(command)).read_all()
+
+    @classmethod
+    def exec_out_into(cls, device, command, buffer):
+        """Same as exec_out, reading stdout straight into buffer.
+
+        Returns:
+            int: Number of bytes read into buffer.
+        """
+        return cls.open(device, 'exec:{}'.format(command)).read_all_into(buffer)
+
+    @classmethod
+    def shell(cls, device, command):
+        """Runs a command with the shell service.
+
+        Returns:
+            bytes: output of the command.
+        """
+        return cls.open(device, 'shell:{}'.format(command)).read_all()
+
+    @classmethod
+    def push(cls, device, local_path, remote_path, mode=None):
+        """Copies a file to the device with the sync service, like `adb push`.
+
+        Args:
+            device (string): transport id or serial of the device.
+            local_path (string): file to copy.
+            remote_path (string): destination path on the device.
+            mode (int, optional): permissions of the copy, those of the local
+                file by default.
+        """
+        if mode is None:
+            mode = os.stat(local_path).st_mode & 0o777
+        stream = cls.open(device, 'sync:')
+        sock = stream.socket
+        try:
+            target = '{},{}'.format(remote_path, 0o100000 | mode).encode('utf-8')
+            sock.sendall(b'SEND' + struct.pack('<I', len(target)) + target)
+            with open(local_path, 'rb') as local_file:
+                while True:
+                    chunk = local_file.read(cls.sync_chunk)
+                    if not chunk:
+                        break
+                    sock.sendall(b'DATA' + struct.pack('<I', len(chunk)) + chunk)
+            sock.sendall(b'DONE' + struct.pack('<I', int(time.time())))
+            status, length = struct.unpack('<4sI', cls.recv_exactly(sock, 8))
+            if status != b'OKAY':
+                message = cls.recv_exactly(sock, length).decode('utf-8', 'replace')
+                raise Exception('Unable to push {} to {}: {}'.format(local_path, remote_path, message))
+            sock.sendall(b'QUIT' + struct.pack('<I', 0))
+        finally:
+            stream.close()
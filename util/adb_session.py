@@ -0,0 +1,106 @@
+import atexit
+import threading
+import uuid
+from util.adb_client import AdbClient
+from util.logger import Logger
+
+class AdbSession(object):
+    """One raw shell stream kept open per device, running commands one after
+    the other instead of opening a stream for each of them.
+
+    Every command is followed by an echo of a marker unique to the session
+    and the exit status of the command, so the end of its output is found
+    without closing the stream. Commands run in a subshell with stdin closed,
+    so they can neither change the session nor swallow the next command.
+    """
+
+    max_retries = 1
+    chunk_size = 1 << 16
+
+    def __init__(self, transport_id):
+        self.transport_id = transport_id
+        self.stream = None
+        self.marker = '__BAAUTO_{}__'.format(uuid.uuid4().hex).encode()
+        self.lock = threading.Lock()
+        self.commands = 0
+        self.reconnects = 0
+        atexit.register(self.close)
+
+    def open(self):
+        """Opens the shell stream, without a terminal so binary output is untouched."""
+        self.close()
+        self.stream = AdbClient.open(self.transport_id, 'shell,raw:')
+        Logger.log_debug('ADB shell session opened with transport_id({}).'.format(self.transport_id))
+
+    def close(self):
+        """Closes the shell stream if it is open."""
+        if self.stream is None:
+            return
+        self.stream.close()
+        self.stream = None
+
+    def alive(self):
+        return self.stream is not None and not self.stream.closed
+
+    def run(self, command, stderr=False):
+        """Runs a command and returns its output.
+
+        Args:
+            command (string): shell command line.
+            stderr (boolean, optional): whether to include stderr in the output.
+
+        Returns:
+            bytes: output of the command.
+        """
+        buffer = bytearray()
+        length = self.run_into(command, buffer, stderr)
+        return bytes(buffer[:length])
+
+    def run_into(self, command, buffer, stderr=False):
+        """Runs a command and reads its output into buffer, growing it only
+        when the output does not fit. The session is reopened and the command
+        sent again if the session was lost.
+
+        Args:
+            command (string): shell command line.
+            buffer (bytearray): reusable buffer receiving the output.
+            stderr (boolean, optional): whether to include stderr in the output.
+
+        Returns:
+            int: length of the output in buffer.
+        """
+        redirect = '2>&1' if stderr else '2>/dev/null'
+        line = '( {} ) </dev/null {}; echo "{}$?"\n'.format(command, redirect, self.marker.decode()).encode()
+        with self.lock:
+            for attempt in range(self.max_retries + 1):
+                if not self.alive():
+                    self.open()
+                try:
+                    self.stream.write(line)
+                    length = self._read_output(buffer)
+                except (OSError, ValueError):
+                    length = None
+                if length is not None:
+                    self.commands += 1
+                    return length
+                self.close()
+                self.reconnects += 1
+                Logger.log_warning('ADB shell session lost, reconnecting ({})...'.format(self.reconnects))
+        raise Exception('ADB shell session failed after {} reconnection attempts'.format(self.max_retries))
+
+    def _read_output(self, buffer):
+        read = 0
+        while True:
+            if len(buffer) - read < self.chunk_size:
+                buffer.extend(bytes(max(len(buffer), self.chunk_size)))
+            with memoryview(buffer) as view:
+                count = self.stream.readinto(view[read:])
+            if not count:
+                return None
+            read += count
+            # the marker line is the last thing written for a command
+            if buffer[read - 1] != 0x0a:
+                continue
+            position = buffer.rfind(self.marker, max(0, read - len(self.marker) - 16), read)
+            if position != -1:
+                return position
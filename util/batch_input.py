@@ -0,0 +1,73 @@
+import os
+import time
+from util.adb import Adb
+from util.cache import Cache
+
+class BatchInput(object):
+    """Sends a series of taps and swipes to the device as one monkey script,
+    so that the whole series costs a push and a single shell command instead
+    of a uiautomator2 request per event.
+
+    Events are tuples:
+        ('tap', x, y)
+        ('swipe', x1, y1, x2, y2, ms)
+        ('wait', seconds)
+    """
+
+    remote_path = '/data/local/tmp/baauto_input.mks'
+    local_name = 'input.mks'
+    # milliseconds between two steps of a swipe
+    swipe_step = 10
+
+    @classmethod
+    def script(cls, events, delay):
+        """Returns the monkey script of the events.
+
+        Args:
+            events (list): taps, swipes and waits, see the class documentation.
+            delay (float): seconds to wait after every tap and swipe.
+
+        Returns:
+            string: the script.
+        """
+        lines = ['type= raw events', 'count= {}'.format(len(events)), 'speed= 1.0', 'start data >>']
+        for event in events:
+            if event[0] == 'tap':
+                lines.append('Tap({},{})'.format(int(event[1]), int(event[2])))
+            elif event[0] == 'swipe':
+                x1, y1, x2, y2, ms = event[1:]
+                lines.append('Drag({},{},{},{},{})'.format(
+                    int(x1), int(y1), int(x2), int(y2), max(2, int(ms) // cls.swipe_step)))
+            elif event[0] == 'wait':
+                lines.append('UserWait({})'.format(int(event[1] * 1000)))
+                continue
+            else:
+                raise Exception('Unknown input event: {}'.format(event))
+            if delay > 0:
+                lines.append('UserWait({})'.format(int(delay * 1000)))
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def send(cls, events, delay=0.02):
+        """Pushes the script of the events to the device and runs it, returning
+        once every event was injected. Raises if monkey did not run the whole
+        script.
+
+        Args:
+            events (list): taps, swipes and waits, see the class documentation.
+            delay (float, optional): seconds to wait after every tap and swipe.
+
+        Returns:
+            float: wall time in seconds, push included.
+        """
+        start_time = time.perf_counter()
+        os.makedirs(Cache.directory, exist_ok=True)
+        local_path = os.path.join(Cache.directory, cls.local_name)
+        with open(local_path, 'w', newline='\n') as script_file:
+            script_file.write(cls.script(events, delay))
+        Adb.cmd('push {} {}'.format(local_path, cls.remote_path))
+        # stderr is kept, monkey reports a rejected script there
+        output = Adb.shell('monkey -f {} 1'.format(cls.remote_path)).decode('utf-8', 'replace')
+        if 'Events injected' not in output or 'Monkey aborted' in output:
+            raise Exception('monkey did not run the input script: {}'.format(output.strip()[-200:]))
+        return time.perf_counter() - start_time
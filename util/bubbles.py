@@ -0,0 +1,60 @@
+import cv2
+import numpy
+
+class BubbleDetector(object):
+    """Finds the interaction bubbles shown above the students of the cafe.
+
+    The bubbles are saturated yellow, so the room is thresholded in HSV and
+    every blob of bubble size and shape is reported. The ranges can be tuned
+    against recorded cafe screenshots with tools/detect_bubbles.py.
+    """
+
+    # part of the screen the students walk in, (x, y, w, h)
+    room = (0, 100, 1280, 480)
+    lower = (15, 140, 200)
+    upper = (35, 255, 255)
+    min_area = 250
+    max_area = 3500
+    # share of its bounding box a bubble covers at least
+    min_fill = 0.45
+    max_aspect = 1.8
+    # pixels below the centre of the bubble to tap at, where the student stands
+    tap_offset = 25
+
+    @classmethod
+    def mask(cls, color_screen):
+        """Returns the binary mask of the bubble coloured pixels of the room."""
+        x, y, w, h = cls.room
+        hsv = cv2.cvtColor(color_screen[y:y + h, x:x + w], cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, cls.lower, cls.upper)
+        return cv2.morphologyEx(mask, cv2.MORPH_OPEN, numpy.ones((3, 3), numpy.uint8))
+
+    @classmethod
+    def find(cls, color_screen):
+        """Finds the bubbles on the screen.
+
+        Args:
+            color_screen (numpy array): BGR screen.
+
+        Returns:
+            list: (x, y, w, h) screen boxes of the bubbles, from top to bottom.
+        """
+        # imported here as imutils imports urllib.request, slow for a single helper
+        from imutils import grab_contours
+        room_x, room_y = cls.room[:2]
+        found = cv2.findContours(cls.mask(color_screen), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in grab_contours(found):
+            area = cv2.contourArea(contour)
+            if not cls.min_area <= area <= cls.max_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            if area < cls.min_fill * w * h or max(w, h) > cls.max_aspect * min(w, h):
+                continue
+            boxes.append((room_x + x, room_y + y, w, h))
+        return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+    @classmethod
+    def taps(cls, boxes):
+        """Returns the tap events for the students of the bubbles."""
+        return [('tap', x + w // 2, min(719, y + h // 2 + cls.tap_offset)) for x, y, w, h in boxes]
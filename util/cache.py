@@ -0,0 +1,46 @@
+import json
+import os
+from util.logger import Logger
+
+class Cache(object):
+    """Small JSON store for data BAAuto learns about a device between runs.
+    Files live in the cache folder next to config.json and can be deleted
+    at any time to start over.
+    """
+
+    directory = 'cache'
+
+    @classmethod
+    def load(cls, name, default=None):
+        """Reads a cache file.
+
+        Args:
+            name (string): Name of the cache file, without extension.
+            default (optional): Returned if the file is missing or unreadable.
+
+        Returns:
+            The decoded JSON content of the file.
+        """
+        path = os.path.join(cls.directory, '{}.json'.format(name))
+        try:
+            with open(path, 'r') as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return default
+        except (OSError, json.JSONDecodeError):
+            Logger.log_warning("Cache file '{}' is unreadable, ignoring it.".format(path))
+            return default
+
+    @classmethod
+    def save(cls, name, data):
+        """Writes a cache file, replacing its previous content.
+
+        Args:
+            name (string): Name of the cache file, without extension.
+            data: JSON serialisable content.
+        """
+        os.makedirs(cls.directory, exist_ok=True)
+        path = os.path.join(cls.directory, '{}.json'.format(name))
+        with open(path + '.tmp', 'w') as json_file:
+            json.dump(data, json_file, indent=2)
+        os.replace(path + '.tmp', path)
@@ -31,6 +31,8 @@ class Config(object):
         self.network = None
         self.assets = None
         self.screenshot_mode = None
+        self.prefetch_frames = False
+        self.game_status_interval = 1
         self.restart_attempts = 0
         self.read()
 
@@ -52,6 +54,8 @@ class Config(object):
         self.network = config_data["login"]["network"]
         self.assets = config_data["login"]["server"]
         self.restart_attempts = config_data["login"]["restart_attempts"]
+        self.prefetch_frames = config_data["login"].get("prefetch_frames", False)
+        self.game_status_interval = config_data["login"].get("game_status_interval", 1)
         self.cafe = config_data.get('cafe', {'enabled': False})
         self.farming = config_data.get('farming', {'enabled':False})
         self.tactical_challenge = config_data["farming"]["tactical_challenge"]
@@ -63,9 +67,10 @@ class Config(object):
         consts = util.config_consts.UtilConsts.ScreenCapMode
         screenshot_mode = config_data.get('login', {}).get('screenshot_mode', '').upper()
         vals = {'SCREENCAP_PNG':consts.SCREENCAP_PNG, 'SCREENCAP_RAW':consts.SCREENCAP_RAW, 
-                'UIAUTOMATOR2': consts.UIAUTOMATOR2, 'ASCREENCAP':consts.ASCREENCAP}
+                'UIAUTOMATOR2': consts.UIAUTOMATOR2, 'ASCREENCAP':consts.ASCREENCAP,
+                'SCREENCAP_STREAM': consts.SCREENCAP_STREAM, 'AUTO': consts.AUTO}
         
-        if screenshot_mode not in ['SCREENCAP_PNG', 'SCREENCAP_RAW', 'UIAUTOMATOR2', 'ASCREENCAP']:
+        if screenshot_mode not in vals:
             raise ValueError("Invalid screenshot mode")
         
         self.screenshot_mode = vals[screenshot_mode]
@@ -10,5 +10,7 @@ class UtilConsts(object):
         SCREENCAP_RAW = enum.auto()
         UIAUTOMATOR2 = enum.auto()
         ASCREENCAP = enum.auto()
+        SCREENCAP_STREAM = enum.auto()
+        AUTO = enum.auto()
 
 
@@ -5,4 +5,8 @@ class GameNotRunningError(Exception):
     pass
 
 class ReadOCRError(Exception):
+    pass
+
+# a GameStuckError, so script.py kills and restarts the game when a wait times out
+class WaitTimeoutError(GameStuckError):
     pass
\ No newline at end of file
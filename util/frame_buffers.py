@@ -0,0 +1,129 @@
+import cv2
+import numpy
+import struct
+
+class FrameSlot(object):
+
+    def __init__(self, height, width):
+        """Initializes a pair of preallocated destination images.
+
+        Args:
+            height (int): Height of the frames stored in the slot.
+            width (int): Width of the frames stored in the slot.
+        """
+        self.color = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        self.gray = numpy.empty((height, width), dtype=numpy.uint8)
+
+
+class FrameBuffers(object):
+    """Preallocated destination images for decoded frames, so that steady-state
+    capture converts straight into existing arrays instead of allocating a new
+    BGR and grayscale image for every frame.
+
+    A frame stays valid as long as it is listed as busy when the next slot is
+    acquired: the screen currently used by Utils and the frames held by the
+    prefetcher's double buffer are never overwritten.
+    """
+
+    slots = []
+
+    @classmethod
+    def acquire(cls, height, width, busy=()):
+        """Returns a slot of the given size whose color image is not in busy.
+
+        Args:
+            height (int): Height of the frame.
+            width (int): Width of the frame.
+            busy (iterable): Color images that must not be overwritten.
+
+        Returns:
+            FrameSlot: slot to decode the next frame into.
+        """
+        for slot in cls.slots:
+            if slot.color.shape[:2] == (height, width) and not any(slot.color is image for image in busy):
+                return slot
+        slot = FrameSlot(height, width)
+        cls.slots.append(slot)
+        return slot
+
+    @classmethod
+    def gray(cls, color_screen):
+        """Converts a BGR frame to grayscale, into its slot's gray image if the frame
+        was decoded into a slot.
+
+        Args:
+            color_screen (numpy array): BGR frame.
+
+        Returns:
+            numpy array: grayscale frame.
+        """
+        for slot in cls.slots:
+            if slot.color is color_screen:
+                return cv2.cvtColor(color_screen, cv2.COLOR_BGR2GRAY, dst=slot.gray)
+        return cv2.cvtColor(color_screen, cv2.COLOR_BGR2GRAY)
+
+    @classmethod
+    def decode_rgba(cls, buffer, offset, width, height, busy=()):
+        """Converts raw RGBA pixels, as written by screencap, into a slot.
+
+        Args:
+            buffer (bytearray or bytes): Buffer holding the pixels.
+            offset (int): Position of the first pixel in buffer.
+            width (int): Width of the frame.
+            height (int): Height of the frame.
+            busy (iterable): Color images that must not be overwritten.
+
+        Returns:
+            numpy array: BGR frame.
+        """
+        pixels = numpy.frombuffer(buffer, dtype=numpy.uint8, count=width * height * 4, offset=offset)
+        slot = cls.acquire(height, width, busy)
+        return cv2.cvtColor(pixels.reshape((height, width, 4)), cv2.COLOR_RGBA2BGR, dst=slot.color)
+
+    @classmethod
+    def decode_bmp(cls, data, busy=()):
+        """Decodes an uncompressed 24 or 32 bit BMP into a slot, without going
+        through cv2.imdecode. 32 bit bitfields BMPs are decoded too when every
+        channel mask is a whole byte, in the order the masks give. Any other
+        format is handed to cv2.imdecode.
+
+        Args:
+            data (bytes-like): BMP file content.
+            busy (iterable): Color images that must not be overwritten.
+
+        Returns:
+            numpy array: BGR frame.
+        """
+        if bytes(data[:2]) != b'BM':
+            return cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+        pixel_offset = struct.unpack_from('<I', data, 10)[0]
+        width, height, planes, bits, compression = struct.unpack_from('<iiHHI', data, 18)
+        if bits not in (24, 32) or compression not in (0, 3) or (compression == 3 and bits != 32):
+            return cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+        # byte of each of the blue, green and red channels in a pixel
+        order = (0, 1, 2)
+        if compression == 3:
+            byte_masks = (0xff, 0xff00, 0xff0000, 0xff000000)
+            red, green, blue = struct.unpack_from('<III', data, 54)
+            if red not in byte_masks or green not in byte_masks or blue not in byte_masks:
+                return cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+            order = tuple(byte_masks.index(mask) for mask in (blue, green, red))
+        channels = bits // 8
+        rows = abs(height)
+        stride = (width * channels + 3) & ~3
+        pixels = numpy.frombuffer(data, dtype=numpy.uint8, count=stride * rows, offset=pixel_offset)
+        pixels = pixels.reshape((rows, stride))[:, :width * channels].reshape((rows, width, channels))
+        if height > 0:
+            # bottom-up bitmap
+            pixels = pixels[::-1]
+        slot = cls.acquire(rows, width, busy)
+        if channels == 3:
+            numpy.copyto(slot.color, pixels)
+        elif order == (0, 1, 2):
+            cv2.cvtColor(pixels, cv2.COLOR_BGRA2BGR, dst=slot.color)
+        elif order == (2, 1, 0):
+            # the native order of Android, RGBA
+            cv2.cvtColor(pixels, cv2.COLOR_RGBA2BGR, dst=slot.color)
+        else:
+            numpy.copyto(slot.color, pixels[:, :, order])
+        return slot.color
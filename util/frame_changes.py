@@ -0,0 +1,90 @@
+import cv2
+import numpy
+
+class FrameChanges(object):
+    """Detects what changed on the screen since the last reported change.
+
+    Each frame is reduced to a small colour signature, one average colour per
+    8x8 pixel cell, and compared with the signature of the last frame that was
+    reported as changed, so that slow fades add up until they cross the
+    threshold instead of being missed frame after frame. Changed cells are
+    grouped into blocks of `block_size` pixels, so that callers can tell
+    whether the part of the screen they look at changed.
+    """
+
+    signature_size = (160, 90)
+    block_size = 80
+    # average change per channel under which a cell is considered unchanged
+    threshold = 3
+
+    # signature of the last frame reported as changed, the reference of the next comparison
+    signature = None
+    shape = None
+    # rows x columns grid of the blocks, True where the block changed, None before the first frame
+    blocks = None
+    regions = []
+
+    @classmethod
+    def update(cls, color_screen):
+        """Compares a new frame with the last frame reported as changed, which
+        it replaces as the reference if it changed.
+
+        Args:
+            color_screen (numpy array): BGR screen.
+
+        Returns:
+            bool: whether anything changed, always True for the first frame or
+                if the resolution changed.
+        """
+        signature = cv2.resize(color_screen, cls.signature_size, interpolation=cv2.INTER_AREA)
+        previous = cls.signature
+        previous_shape, cls.shape = cls.shape, color_screen.shape[:2]
+        rows, columns = -(-cls.shape[0] // cls.block_size), -(-cls.shape[1] // cls.block_size)
+        if previous is None or previous_shape != cls.shape:
+            cls.signature = signature
+            cls.blocks = numpy.ones((rows, columns), dtype=bool)
+            cls.regions = [(0, 0, color_screen.shape[1], color_screen.shape[0])]
+            return True
+        cells = (cv2.absdiff(signature, previous) > cls.threshold).any(axis=2)
+        # map every cell to the block it falls in
+        cell_rows = numpy.arange(cells.shape[0]) * rows // cells.shape[0]
+        cell_columns = numpy.arange(cells.shape[1]) * columns // cells.shape[1]
+        blocks = numpy.zeros((rows, columns), dtype=bool)
+        changed_rows, changed_columns = numpy.nonzero(cells)
+        blocks[cell_rows[changed_rows], cell_columns[changed_columns]] = True
+        cls.blocks = blocks
+        cls.regions = cls.group(blocks)
+        if not blocks.any():
+            return False
+        cls.signature = signature
+        return True
+
+    @classmethod
+    def group(cls, blocks):
+        """Returns the bounding boxes, in pixels, of the connected groups of changed blocks."""
+        if not blocks.any():
+            return []
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(blocks.astype(numpy.uint8), connectivity=8)
+        return [(int(x) * cls.block_size, int(y) * cls.block_size, int(w) * cls.block_size, int(h) * cls.block_size)
+                for x, y, w, h, area in stats[1:]]
+
+    @classmethod
+    def changed(cls, x=0, y=0, w=None, h=None):
+        """Whether the area changed in the last comparison. The whole screen
+        is checked when no size is given.
+        """
+        if cls.blocks is None:
+            return True
+        if w is None or h is None:
+            return bool(cls.blocks.any())
+        x1, y1 = max(0, x // cls.block_size), max(0, y // cls.block_size)
+        x2, y2 = (x + w - 1) // cls.block_size + 1, (y + h - 1) // cls.block_size + 1
+        return bool(cls.blocks[y1:y2, x1:x2].any())
+
+    @classmethod
+    def reset(cls):
+        """Forgets the previous frame, the next one is reported as changed."""
+        cls.signature = None
+        cls.shape = None
+        cls.blocks = None
+        cls.regions = []
@@ -0,0 +1,109 @@
+import atexit
+import time
+import threading
+from util.logger import Logger
+
+class FramePrefetcher(object):
+    """Captures and decodes frames on a background thread into a double buffer,
+    so that screen capture overlaps template matching and OCR on the caller's side.
+
+    Every frame is stamped with the time its capture started. Consumers ask for
+    the freshest frame started after a given timestamp, which guarantees that a
+    frame returned after an input was captured after that input.
+    """
+
+    thread = None
+    running = False
+    condition = threading.Condition()
+    buffers = [None, None]
+    front = 0
+    error = None
+    idle_after = 3
+    last_request = 0
+    frames_captured = 0
+
+    @classmethod
+    def start(cls, capture):
+        """Starts the capture thread.
+
+        Args:
+            capture (function): called without arguments, returns a BGR and a
+                grayscale frame.
+        """
+        if cls.running:
+            return
+        cls.running = True
+        cls.error = None
+        cls.buffers = [None, None]
+        cls.last_request = time.perf_counter()
+        cls.thread = threading.Thread(target=cls._run, args=(capture,), daemon=True)
+        cls.thread.start()
+        atexit.register(cls.stop)
+        Logger.log_debug('Frame prefetcher started.')
+
+    @classmethod
+    def stop(cls):
+        """Stops the capture thread and waits for it to exit."""
+        with cls.condition:
+            cls.running = False
+            cls.condition.notify_all()
+        if cls.thread is not None:
+            cls.thread.join()
+            cls.thread = None
+
+    @classmethod
+    def _run(cls, capture):
+        while cls.running:
+            with cls.condition:
+                # stop hammering the device while nobody is asking for frames
+                while cls.running and time.perf_counter() - cls.last_request > cls.idle_after:
+                    cls.condition.wait()
+            if not cls.running:
+                break
+            captured_at = time.perf_counter()
+            try:
+                color_screen, screen = capture()
+            except Exception as e:
+                # update_screen captures on its own thread once this one stopped, say why
+                Logger.log_warning('Frame prefetcher stopped, capturing frames synchronously: {}'.format(e))
+                with cls.condition:
+                    cls.error = e
+                    cls.running = False
+                    cls.condition.notify_all()
+                break
+            with cls.condition:
+                back = 1 - cls.front
+                cls.buffers[back] = (captured_at, color_screen, screen)
+                cls.front = back
+                cls.frames_captured += 1
+                cls.condition.notify_all()
+
+    @classmethod
+    def held_frames(cls):
+        """Returns the color frames currently held by the double buffer."""
+        return [frame[1] for frame in cls.buffers if frame is not None]
+
+    @classmethod
+    def get_frame(cls, newer_than=0):
+        """Returns the freshest frame whose capture started at or after newer_than,
+        blocking until the capture thread produces one.
+
+        Args:
+            newer_than (float): time.perf_counter() timestamp.
+
+        Returns:
+            tuple: capture timestamp, BGR frame and grayscale frame.
+        """
+        with cls.condition:
+            cls.last_request = time.perf_counter()
+            cls.condition.notify_all()
+            while True:
+                if cls.error is not None:
+                    error, cls.error = cls.error, None
+                    raise error
+                if not cls.running:
+                    raise Exception('Frame prefetcher is not running')
+                frame = cls.buffers[cls.front]
+                if frame is not None and frame[0] >= newer_than:
+                    return frame
+                cls.condition.wait()
@@ -0,0 +1,80 @@
+import atexit
+import threading
+from util.adb import Adb
+from util.logger import Logger
+
+class GameWatcher(object):
+    """Polls the foreground package on a background thread, so that the game
+    status checks made before every find and touch read a flag instead of
+    asking the device.
+    """
+
+    package = 'com.nexon.bluearchive'
+    interval = 1.0
+
+    thread = None
+    running = False
+    stopped = threading.Event()
+    # foreground package seen by the last poll, None if it failed or nothing was polled yet
+    foreground = None
+    polls = 0
+
+    @classmethod
+    def start(cls, interval=None):
+        """Starts the watcher thread.
+
+        Args:
+            interval (float, optional): seconds between two polls.
+        """
+        if cls.running:
+            return
+        if interval is not None:
+            cls.interval = interval
+        cls.running = True
+        cls.stopped.clear()
+        cls.thread = threading.Thread(target=cls._run, daemon=True)
+        cls.thread.start()
+        atexit.register(cls.stop)
+        Logger.log_debug('Game watcher started, polling every {} seconds.'.format(cls.interval))
+
+    @classmethod
+    def stop(cls):
+        """Stops the watcher thread and waits for it to exit."""
+        cls.running = False
+        cls.stopped.set()
+        if cls.thread is not None:
+            cls.thread.join()
+            cls.thread = None
+        cls.foreground = None
+
+    @classmethod
+    def _run(cls):
+        while cls.running:
+            cls.poll()
+            cls.stopped.wait(cls.interval)
+
+    @classmethod
+    def poll(cls):
+        """Asks the device for the foreground package and caches it.
+
+        Returns:
+            bool: whether the game is in the foreground.
+        """
+        try:
+            cls.foreground = Adb.u2device.app_current()['package']
+        except Exception as e:
+            # an unknown state makes the next check ask the device itself
+            cls.foreground = None
+            Logger.log_debug('Game watcher poll failed: {}'.format(e))
+        cls.polls += 1
+        return cls.foreground == cls.package
+
+    @classmethod
+    def game_running(cls):
+        """Returns the cached game status: True if the game was in the
+        foreground at the last poll, False if another package was, None if
+        the watcher does not know.
+        """
+        if not cls.running or cls.foreground is None:
+            return None
+        return cls.foreground == cls.package
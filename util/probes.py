@@ -0,0 +1,171 @@
+import cv2
+import numpy
+import threading
+import zlib
+from util.cache import Cache
+from util.logger import Logger
+from util.templates import Templates
+
+class PixelProbes(object):
+    """Answers whether a screen-state template is on screen by sampling a
+    handful of pixels instead of correlating the whole template.
+
+    A probe signature is the region of the template plus a few points inside
+    it with their expected BGR colour. Signatures are either declared, or
+    learned from the first full match of the template and persisted in
+    cache/probes.json. Learned signatures are bound to the checksum of the
+    asset, so they are relearned when the asset changes.
+
+    Only templates that always show up at the same place can be probed, they
+    are listed in `templates`. Run tools/verify_probes.py against recorded
+    screenshots before listing a template.
+    """
+
+    # names of the templates find answers with probes, none until checked
+    # with tools/verify_probes.py, e.g. goto/home, goto/settings and farming/sweep
+    templates = set()
+
+    # maximum difference per channel for a point to match
+    tolerance = 30
+    # the template is considered absent when fewer points than this share match
+    reject_below = 0.5
+    # points are picked from a grid x grid partition of the template
+    grid = 3
+    min_points = 4
+
+    # template name: {'region': [x, y, w, h], 'points': [[x, y], ...], 'colors': [[b, g, r], ...]}
+    declared = {}
+
+    learned = None
+    compiled = {}
+    stats = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        if cls.learned is None:
+            cls.learned = Cache.load('probes', {})
+
+    @classmethod
+    def checksum(cls, server, image):
+        template = Templates.color(server, image)
+        return None if template is None else zlib.crc32(template.tobytes())
+
+    @classmethod
+    def signature(cls, server, image):
+        """Returns the probe signature of a template as numpy arrays, or None
+        if it has none yet.
+
+        Returns:
+            tuple: region, x coordinates, y coordinates and colours of the points.
+        """
+        key = (server, image)
+        if key in cls.compiled:
+            return cls.compiled[key]
+        if image in cls.declared:
+            signature = cls.declared[image]
+        else:
+            cls.load()
+            signature = cls.learned.get(server, {}).get(image)
+            if signature is not None and signature.get('checksum') != cls.checksum(server, image):
+                signature = None
+        if signature is None:
+            return None
+        points = numpy.asarray(signature['points'], dtype=numpy.intp)
+        compiled = (tuple(signature['region']), points[:, 0], points[:, 1],
+                    numpy.asarray(signature['colors'], dtype=numpy.int16))
+        cls.compiled[key] = compiled
+        return compiled
+
+    @classmethod
+    def check(cls, server, image, color_screen):
+        """Samples the probe points of a template from the screen.
+
+        Args:
+            server (string): Server of the assets.
+            image (string): Name of the template.
+            color_screen (numpy array): BGR screen.
+
+        Returns:
+            tuple: verdict and region. The verdict is True if every point matches,
+                False if too few points match, and None if the signature is
+                missing or the probes are inconclusive. The region (x, y, w, h)
+                of the signature is given whenever the verdict is not None.
+        """
+        signature = cls.signature(server, image)
+        if signature is None:
+            return None, None
+        region, xs, ys, colors = signature
+        samples = color_screen[ys, xs].astype(numpy.int16)
+        matching = numpy.count_nonzero((numpy.abs(samples - colors) <= cls.tolerance).all(axis=1))
+        if matching == len(colors):
+            verdict = True
+        elif matching < cls.reject_below * len(colors):
+            verdict = False
+        else:
+            verdict = None
+        cls.count(image, verdict)
+        return verdict, None if verdict is None else region
+
+    @classmethod
+    def learn(cls, server, image, color_screen, x, y, w, h):
+        """Builds the probe signature of a template from a full match, unless
+        it already has one. Points are taken from flat areas of the match that
+        differ the most from its average colour, one per grid cell, and only
+        where the screen agrees with the asset.
+
+        Args:
+            server (string): Server of the assets.
+            image (string): Name of the template.
+            color_screen (numpy array): BGR screen the template was found on.
+            x, y, w, h (int): Region of the match.
+        """
+        if image in cls.declared or cls.signature(server, image) is not None:
+            return
+        template = Templates.color(server, image)
+        patch = color_screen[y:y + h, x:x + w]
+        if template is None or patch.shape != template.shape:
+            return
+        # flat areas keep their colour when the screen is off by a pixel
+        gray = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY).astype(numpy.float32)
+        variance = cv2.blur(gray * gray, (5, 5)) - cv2.blur(gray, (5, 5)) ** 2
+        score = numpy.abs(patch.astype(numpy.float32) - patch.reshape(-1, 3).mean(axis=0)).sum(axis=2)
+        agrees = (numpy.abs(patch.astype(numpy.int16) - template) <= cls.tolerance // 2).all(axis=2)
+        score[(variance > 36) | ~agrees] = -1
+        score[:2, :], score[-2:, :], score[:, :2], score[:, -2:] = -1, -1, -1, -1
+
+        points, colors = [], []
+        for rows in numpy.array_split(numpy.arange(h), cls.grid):
+            for columns in numpy.array_split(numpy.arange(w), cls.grid):
+                if len(rows) == 0 or len(columns) == 0:
+                    continue
+                cell = score[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+                row, column = numpy.unravel_index(numpy.argmax(cell), cell.shape)
+                if cell[row, column] < 0:
+                    continue
+                row, column = rows[0] + row, columns[0] + column
+                points.append([int(x + column), int(y + row)])
+                colors.append([int(channel) for channel in patch[row, column]])
+        if len(points) < cls.min_points:
+            return
+        cls.load()
+        with cls.lock:
+            cls.learned.setdefault(server, {})[image] = {
+                'region': [x, y, w, h], 'points': points, 'colors': colors,
+                'checksum': cls.checksum(server, image)}
+            cls.compiled.pop((server, image), None)
+            Cache.save('probes', cls.learned)
+        Logger.log_debug('Learned {} probes for {}.'.format(len(points), image))
+
+    @classmethod
+    def count(cls, image, verdict):
+        with cls.lock:
+            stats = cls.stats.setdefault(image, {True: 0, False: 0, None: 0})
+            stats[verdict] += 1
+
+    @classmethod
+    def report(cls):
+        """Logs how often the probes of every template were conclusive."""
+        for image, stats in sorted(cls.stats.items()):
+            Logger.log_debug('Probes {}: {} present, {} absent, {} inconclusive'.format(
+                image, stats[True], stats[False], stats[None]))
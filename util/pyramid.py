@@ -0,0 +1,116 @@
+import cv2
+import numpy
+
+class PyramidMatcher(object):
+    """Coarse-to-fine template matching. The template is first correlated
+    against a downscaled screen to find candidate peaks, then every candidate
+    is confirmed at full resolution inside a small neighbourhood.
+
+    It trades a little accuracy on small or low contrast templates for speed,
+    so it is only used for the templates listed in `templates`. Run
+    tools/benchmark_pyramid.py to check a template before listing it.
+    """
+
+    # names of the templates find and find_all search with the pyramid
+    templates = set()
+
+    scale = 0.5
+    # candidates may score this much lower on the coarse level than the final similarity
+    coarse_margin = 0.15
+    max_candidates = 8
+    # smallest template side, after downscaling, that still gives meaningful peaks
+    min_size = 8
+
+    @classmethod
+    def downscale(cls, image):
+        """Returns the image resized to the coarse level."""
+        return cv2.resize(image, None, fx=cls.scale, fy=cls.scale, interpolation=cv2.INTER_AREA)
+
+    @classmethod
+    def usable(cls, small_template):
+        """Whether the downscaled template is big enough for the coarse search."""
+        return min(small_template.shape[:2]) >= cls.min_size
+
+    @classmethod
+    def candidate_boxes(cls, small_screen, small_template, similarity, limit):
+        """Finds the coarse peaks and returns the full resolution neighbourhood of
+        each one, as boxes over the positions of the template's top-left corner.
+
+        Args:
+            small_screen (numpy array): downscaled screen.
+            small_template (numpy array): downscaled template.
+            similarity (float): final similarity threshold.
+            limit (int): maximum number of candidates, None for no limit.
+
+        Returns:
+            list: (x1, y1, x2, y2) boxes in full resolution coordinates, inclusive.
+        """
+        coarse = cv2.matchTemplate(small_screen, small_template, cv2.TM_CCOEFF_NORMED)
+        threshold = similarity - cls.coarse_margin
+        radius = int(round(1 / cls.scale)) + 1
+        height, width = small_template.shape[:2]
+        boxes = []
+        while limit is None or len(boxes) < limit:
+            value, location = cv2.minMaxLoc(coarse)[1], cv2.minMaxLoc(coarse)[3]
+            if value < threshold:
+                break
+            x, y = int(location[0] / cls.scale), int(location[1] / cls.scale)
+            boxes.append((x - radius, y - radius, x + radius, y + radius))
+            # suppress the peak and its surroundings so the next one is a different candidate
+            coarse[max(0, location[1] - height // 2):location[1] + height // 2 + 1,
+                   max(0, location[0] - width // 2):location[0] + width // 2 + 1] = -1
+        return boxes
+
+    @classmethod
+    def refine(cls, screen, template, box):
+        """Correlates the template at full resolution for every top-left position
+        inside box.
+
+        Returns:
+            tuple: match map and the (x, y) screen position of its first element,
+                or (None, None) if the box falls outside the screen.
+        """
+        height, width = template.shape[:2]
+        x1, y1 = max(0, box[0]), max(0, box[1])
+        x2, y2 = min(screen.shape[1] - width, box[2]), min(screen.shape[0] - height, box[3])
+        if x2 < x1 or y2 < y1:
+            return None, None
+        patch = screen[y1:y2 + height, x1:x2 + width]
+        return cv2.matchTemplate(patch, template, cv2.TM_CCOEFF_NORMED), (x1, y1)
+
+    @classmethod
+    def match_best(cls, screen, small_screen, template, small_template, similarity):
+        """Returns the best full resolution match among the coarse candidates.
+
+        Returns:
+            tuple: best value and (x, y) location, value is -1 if there is no candidate.
+        """
+        best_value, best_location = -1, None
+        for box in cls.candidate_boxes(small_screen, small_template, similarity, cls.max_candidates):
+            match, origin = cls.refine(screen, template, box)
+            if match is None:
+                continue
+            value, location = cv2.minMaxLoc(match)[1], cv2.minMaxLoc(match)[3]
+            if value > best_value:
+                best_value, best_location = value, (location[0] + origin[0], location[1] + origin[1])
+        return best_value, best_location
+
+    @classmethod
+    def match_all(cls, screen, small_screen, template, small_template, similarity):
+        """Returns every full resolution location matching at least similarity,
+        in the same (rows, columns) form as numpy.where on a full match map.
+        """
+        ys, xs = [], []
+        for box in cls.candidate_boxes(small_screen, small_template, similarity, None):
+            match, origin = cls.refine(screen, template, box)
+            if match is None:
+                continue
+            rows, columns = numpy.where(match >= similarity)
+            ys.append(rows + origin[1])
+            xs.append(columns + origin[0])
+        if not ys:
+            return numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.int64)
+        ys, xs = numpy.concatenate(ys), numpy.concatenate(xs)
+        # neighbourhoods can overlap, keep each location once and in row-major order
+        order = numpy.unique(ys.astype(numpy.int64) * screen.shape[1] + xs)
+        return order // screen.shape[1], order % screen.shape[1]
@@ -0,0 +1,131 @@
+import threading
+from util.cache import Cache
+from util.logger import Logger
+
+class RoiIndex(object):
+    """Search windows for templates that always show up around the same place,
+    so that find correlates against a small patch instead of the whole screen.
+
+    A window is either declared, or learned from the past matches of the
+    template and persisted in cache/roi_hints.json. Matches are grouped into
+    spots, and only spots matched `min_hits` times make up the window, so a
+    single false positive far away does not widen it. Only the `max_spots`
+    most recently matched spots are kept, so stale ones expire. Hits and
+    misses are counted per template to help tuning the windows.
+    """
+
+    screen_width = 1280
+    screen_height = 720
+    margin = 20
+    # matches whose top left corners are this close belong to the same spot
+    spot_tolerance = 4
+    min_hits = 2
+    max_spots = 8
+
+    # template name: (x, y, w, h), windows declared by hand take precedence over learned ones
+    declared = {}
+
+    learned = None
+    stats = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        if cls.learned is None:
+            cls.learned = Cache.load('roi_hints', {})
+            # drop the bounding boxes of older versions, which were not split into spots
+            for boxes in cls.learned.values():
+                for image in [image for image, spots in boxes.items() if spots and not isinstance(spots[0], list)]:
+                    del boxes[image]
+
+    @classmethod
+    def box(cls, server, image):
+        """Returns the bounding box of the confirmed spots of a template.
+
+        Returns:
+            tuple: x1, y1, x2 and y2, or None if no spot was matched min_hits times.
+        """
+        cls.load()
+        spots = [spot for spot in cls.learned.get(server, {}).get(image, []) if spot[4] >= cls.min_hits]
+        if not spots:
+            return None
+        return (min(spot[0] for spot in spots), min(spot[1] for spot in spots),
+                max(spot[2] for spot in spots), max(spot[3] for spot in spots))
+
+    @classmethod
+    def window(cls, server, image, width, height):
+        """Returns the search window of a template.
+
+        Args:
+            server (string): Server of the assets.
+            image (string): Name of the template.
+            width (int): Width of the template.
+            height (int): Height of the template.
+
+        Returns:
+            tuple: x, y, w and h of the window, or None if the template has none.
+        """
+        if image in cls.declared:
+            x, y, w, h = cls.declared[image]
+            x1, y1, x2, y2 = x, y, x + w, y + h
+        else:
+            box = cls.box(server, image)
+            if box is None:
+                return None
+            x1, y1, x2, y2 = box[0] - cls.margin, box[1] - cls.margin, box[2] + cls.margin, box[3] + cls.margin
+        # the window can never be smaller than the template
+        x2, y2 = max(x2, x1 + width), max(y2, y1 + height)
+        x1, y1 = max(0, min(x1, cls.screen_width - width)), max(0, min(y1, cls.screen_height - height))
+        x2, y2 = min(cls.screen_width, x2), min(cls.screen_height, y2)
+        return x1, y1, x2 - x1, y2 - y1
+
+    @classmethod
+    def learn(cls, server, image, x, y, w, h):
+        """Counts a full screen match of a template in its spot, starting a
+        new spot if it is far from the known ones.
+
+        Args:
+            server (string): Server of the assets.
+            image (string): Name of the template.
+            x, y, w, h (int): Region of the match.
+        """
+        if image in cls.declared:
+            return
+        cls.load()
+        with cls.lock:
+            spots = cls.learned.setdefault(server, {}).setdefault(image, [])
+            for index, spot in enumerate(spots):
+                if abs(spot[0] - x) <= cls.spot_tolerance and abs(spot[1] - y) <= cls.spot_tolerance:
+                    break
+            else:
+                index, spot = None, [x, y, x + w, y + h, 0]
+            inside = spot[0] <= x and spot[1] <= y and x + w <= spot[2] and y + h <= spot[3]
+            # nothing to save for another match of the latest confirmed spot
+            if index == len(spots) - 1 and spot[4] >= cls.min_hits and inside:
+                return
+            if index is not None:
+                spots.pop(index)
+            spot[:4] = [min(spot[0], x), min(spot[1], y), max(spot[2], x + w), max(spot[3], y + h)]
+            spot[4] = min(spot[4] + 1, cls.min_hits)
+            # the most recently matched spot last, the oldest ones expire
+            spots.append(spot)
+            del spots[:-cls.max_spots]
+            Cache.save('roi_hints', cls.learned)
+
+    @classmethod
+    def count(cls, image, hit):
+        """Counts a window search of a template.
+
+        Args:
+            image (string): Name of the template.
+            hit (bool): Whether the template was found inside the window.
+        """
+        with cls.lock:
+            stats = cls.stats.setdefault(image, {'hits': 0, 'misses': 0})
+            stats['hits' if hit else 'misses'] += 1
+
+    @classmethod
+    def report(cls):
+        """Logs the hits and misses of every template searched through a window."""
+        for image, stats in sorted(cls.stats.items()):
+            Logger.log_debug('ROI {}: {} hits, {} misses'.format(image, stats['hits'], stats['misses']))
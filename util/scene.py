@@ -0,0 +1,171 @@
+import cv2
+import numpy
+from util.cache import Cache
+from util.probes import PixelProbes
+from util.roi import RoiIndex
+from util.templates import Templates
+
+class SceneClassifier(object):
+    """Tells which game screen a frame shows in a single pass.
+
+    Every scene has an anchor template. Once the place of the anchor on screen
+    is known, from its learned search window or probe signature, the frame is
+    cropped there and compared with the anchor through small zero-mean colour
+    signatures, which costs a few microseconds per scene. Frames recorded with
+    tools/build_scenes.py add whole screen signatures per scene, used when no
+    anchor is conclusive.
+    """
+
+    # scene label: anchor template
+    anchors = {
+        'home': 'goto/home',
+        'cafe': 'goto/cafe',
+        'club': 'goto/club',
+        'tasks': 'goto/tasks',
+        'mailbox': 'goto/mailbox',
+        'campaign': 'goto/campaign',
+        'mission': 'goto/mission',
+        'bounty': 'goto/bounty',
+        'scrimmage': 'goto/scrimmage',
+        'commissions': 'goto/commissions',
+        'tactical_challenge': 'goto/tactical_challenge',
+        'event': 'goto/event',
+        'skip': 'goto/skip',
+        'sweep': 'farming/sweep',
+        'momotalk': 'cafe/momotalk'
+    }
+
+    # cells of an anchor signature, laid out with the aspect ratio of the anchor
+    # so that wide text anchors such as goto/bounty and goto/commissions stay apart
+    signature_cells = 512
+    frame_signature_size = (32, 18)
+    min_confidence = 0.9
+    # lead the best anchor needs over the runner-up
+    min_margin = 0.05
+    min_frame_confidence = 0.95
+    # largest difference of average brightness with the anchor, a dimmed anchor is behind a popup
+    max_brightness_difference = 40
+
+    signatures = {}
+    recorded = None
+
+    @staticmethod
+    def signature(image, size):
+        """Returns the unit length, zero-mean signature of an image downscaled
+        to size, or None if the image is flat.
+        """
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA).astype(numpy.float32).ravel()
+        small -= small.mean()
+        norm = numpy.linalg.norm(small)
+        if norm < 1e-3:
+            return None
+        return small / norm
+
+    @classmethod
+    def anchor_size(cls, width, height):
+        """Returns the signature size of an anchor of width x height pixels."""
+        columns = max(4, round((cls.signature_cells * width / height) ** 0.5))
+        rows = max(4, round(cls.signature_cells / columns))
+        return min(columns, width), min(rows, height)
+
+    @classmethod
+    def anchor(cls, server, label):
+        """Returns the region and signatures of the anchor of a scene, or None
+        while its place on screen is unknown.
+        """
+        name = cls.anchors[label]
+        key = (server, name)
+        if key in cls.signatures:
+            return cls.signatures[key]
+        template = Templates.color(server, name)
+        if template is None:
+            return None
+        height, width = template.shape[:2]
+        region = cls.locate(server, name, width, height)
+        if region is None:
+            return None
+        size = cls.anchor_size(width, height)
+        signature = cls.signature(template, size)
+        if signature is None:
+            return None
+        cls.signatures[key] = (region, size, signature, float(template.mean()))
+        return cls.signatures[key]
+
+    @staticmethod
+    def locate(server, name, width, height):
+        signature = PixelProbes.signature(server, name)
+        if signature is not None:
+            return signature[0]
+        box = RoiIndex.box(server, name)
+        # the anchor has a fixed place only if all its confirmed matches were at the same spot
+        if box is not None and box[2] - box[0] == width and box[3] - box[1] == height:
+            return box[0], box[1], width, height
+        return None
+
+    @classmethod
+    def classify(cls, server, color_screen):
+        """Returns the most likely scene of a frame.
+
+        Args:
+            server (string): Server of the assets.
+            color_screen (numpy array): BGR screen.
+
+        Returns:
+            tuple: scene label and confidence. The label is None if no scene
+                reaches the minimum confidence with a clear lead over the
+                runner-up, the confidence is then the best score found.
+        """
+        best_label, best_score, second_score = None, -1, -1
+        for label in cls.anchors:
+            anchor = cls.anchor(server, label)
+            if anchor is None:
+                continue
+            (x, y, w, h), size, signature, brightness = anchor
+            crop = color_screen[y:y + h, x:x + w]
+            if abs(float(crop.mean()) - brightness) > cls.max_brightness_difference:
+                continue
+            crop_signature = cls.signature(crop, size)
+            if crop_signature is None:
+                continue
+            score = float(numpy.dot(signature, crop_signature))
+            if score > best_score:
+                best_label, best_score, second_score = label, score, best_score
+            elif score > second_score:
+                second_score = score
+        if best_score >= cls.min_confidence and best_score - second_score >= cls.min_margin:
+            return best_label, best_score
+
+        frame_label, frame_score = cls.match_recorded(server, color_screen)
+        if frame_score >= cls.min_frame_confidence:
+            return frame_label, frame_score
+        return None, max(best_score, frame_score)
+
+    @classmethod
+    def match_recorded(cls, server, color_screen):
+        """Compares the whole frame with the recorded frames of every scene.
+
+        Returns:
+            tuple: label of the closest recorded frame and its score, (None, -1)
+                if no frame was recorded.
+        """
+        if cls.recorded is None:
+            cls.recorded = {server_name: {label: numpy.asarray(signatures, dtype=numpy.float32)
+                                          for label, signatures in scenes.items()}
+                            for server_name, scenes in Cache.load('scenes', {}).items()}
+        scenes = cls.recorded.get(server)
+        if not scenes:
+            return None, -1
+        signature = cls.signature(color_screen, cls.frame_signature_size)
+        if signature is None:
+            return None, -1
+        best_label, best_score = None, -1
+        for label, signatures in scenes.items():
+            score = float((signatures @ signature).max())
+            if score > best_score:
+                best_label, best_score = label, score
+        return best_label, best_score
+
+    @classmethod
+    def forget(cls):
+        """Drops the anchors computed so far, to pick up newly learned places."""
+        cls.signatures = {}
@@ -0,0 +1,139 @@
+import atexit
+import struct
+import time
+from collections import deque
+from util.adb import Adb
+from util.adb_client import AdbClient
+from util.logger import Logger
+
+class ScreenCapStream(object):
+    """Keeps a single raw shell stream open to the device and pulls screencap
+    frames through it on demand, so that a frame no longer pays for opening
+    a new stream and the ADB handshake.
+
+    Devices without shell_v2 have no raw shell, their frames are pulled with
+    an exec stream per frame instead.
+    """
+
+    stream = None
+    # whether frames are pulled with an exec stream per frame
+    per_frame = False
+    exit_registered = False
+    header_size = None
+    max_retries = 3
+    reconnects = 0
+    buffer = bytearray()
+    latencies = deque(maxlen=100)
+
+    @classmethod
+    def open(cls):
+        """Opens the capture channel. The size of the screencap header varies
+        between Android versions (12 bytes before Android 9, 16 bytes after),
+        so it is measured once from a regular exec-out screencap.
+        """
+        cls.close()
+        if cls.header_size is None:
+            byte_arr = Adb.exec_out('screencap')
+            width, height = struct.unpack('II', byte_arr[:8])
+            header_size = len(byte_arr) - width * height * 4
+            if header_size not in (12, 16):
+                raise Exception('Unable to measure the screencap header, received {} bytes for a {}x{} frame'.format(
+                    len(byte_arr), width, height))
+            cls.header_size = header_size
+        if not cls.exit_registered:
+            atexit.register(cls.close)
+            cls.exit_registered = True
+        cls.per_frame = not AdbClient.has_shell_v2(Adb.serial or Adb.transID)
+        if cls.per_frame:
+            Logger.log_debug('Device does not support shell_v2, pulling screencap frames with exec streams.')
+            return
+        cls.stream = AdbClient.open(Adb.transID, 'shell,raw:')
+        Logger.log_debug('Screencap stream opened with transport_id({}).'.format(Adb.transID))
+
+    @classmethod
+    def close(cls):
+        """Closes the capture channel if it is open."""
+        if cls.stream is None:
+            return
+        cls.stream.close()
+        cls.stream = None
+
+    @classmethod
+    def reconnect(cls):
+        """Closes and reopens the capture channel."""
+        cls.reconnects += 1
+        Logger.log_warning('Screencap stream lost, reconnecting ({})...'.format(cls.reconnects))
+        cls.open()
+
+    @classmethod
+    def read_frame(cls):
+        """Requests a frame through the open channel, reconnecting if the
+        channel was dropped or returned a truncated frame.
+
+        Returns:
+            tuple: width, height and a buffer starting with the RGBA pixels of
+                the frame. The buffer is reused by the next call.
+        """
+        for attempt in range(cls.max_retries + 1):
+            if not cls.per_frame and (cls.stream is None or cls.stream.closed):
+                cls.reconnect()
+            start_time = time.perf_counter()
+            try:
+                frame = cls._request()
+            except (OSError, ValueError):
+                frame = None
+            if frame is not None:
+                cls.latencies.append(time.perf_counter() - start_time)
+                return frame
+            cls.close()
+        raise Exception('Screencap stream failed after {} reconnection attempts'.format(cls.max_retries))
+
+    @classmethod
+    def _request(cls):
+        if cls.per_frame:
+            return cls._request_exec()
+        # the raw shell merges stderr into stdout, keep warnings out of the frame
+        cls.stream.write(b'screencap 2>/dev/null\n')
+        if not cls._read_exactly(cls.header_size):
+            return None
+        width, height = struct.unpack_from('II', cls.buffer)
+        if not (0 < width <= 8192 and 0 < height <= 8192):
+            return None
+        if not cls._read_exactly(width * height * 4):
+            return None
+        return width, height, cls.buffer
+
+    @classmethod
+    def _request_exec(cls):
+        length = AdbClient.exec_out_into(Adb.transID, 'screencap 2>/dev/null', cls.buffer)
+        if length < cls.header_size:
+            return None
+        width, height = struct.unpack_from('II', cls.buffer)
+        if not (0 < width <= 8192 and 0 < height <= 8192) or length < cls.header_size + width * height * 4:
+            return None
+        # the pixels are expected at the start of the buffer, as with the stream
+        cls.buffer[:width * height * 4] = cls.buffer[cls.header_size:cls.header_size + width * height * 4]
+        return width, height, cls.buffer
+
+    @classmethod
+    def _read_exactly(cls, size):
+        # the same buffer is reused for every read, it only grows for bigger frames
+        if len(cls.buffer) < size:
+            cls.buffer = bytearray(size)
+        with memoryview(cls.buffer) as view:
+            read = 0
+            while read < size:
+                count = cls.stream.readinto(view[read:size])
+                if not count:
+                    return False
+                read += count
+        return True
+
+    @classmethod
+    def average_latency(cls):
+        """Returns the average per-frame latency in seconds over the most
+        recent frames, or None if no frame has been captured yet.
+        """
+        if not cls.latencies:
+            return None
+        return sum(cls.latencies) / len(cls.latencies)
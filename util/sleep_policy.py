@@ -0,0 +1,92 @@
+import atexit
+import threading
+import numpy
+from util.cache import Cache
+from util.logger import Logger
+
+class SleepPolicy(object):
+    """Learns how long the screen takes to react to an action on this device.
+
+    Durations are recorded per transition, a (from scene, action, to scene)
+    tuple, and persisted in cache/transitions.json. Once a transition has
+    enough samples, wait_time gives a high percentile of them, so a fast
+    device waits a little and a slow emulator still waits long enough. Every
+    `recheck_every` uses the transition is watched again instead, so that the
+    samples follow the device when it gets slower.
+    """
+
+    percentile = 90
+    min_samples = 10
+    # most recent samples kept per transition, so that the policy follows the device
+    max_samples = 50
+    min_wait = 0.05
+    recheck_every = 10
+
+    samples = None
+    # transition key: number of times its learned wait was asked for
+    uses = {}
+    dirty = False
+    lock = threading.Lock()
+
+    @staticmethod
+    def key(transition):
+        return '>'.join(transition)
+
+    @classmethod
+    def load(cls):
+        if cls.samples is None:
+            cls.samples = Cache.load('transitions', {})
+            atexit.register(cls.save)
+
+    @classmethod
+    def record(cls, transition, duration):
+        """Records the duration of a transition.
+
+        Args:
+            transition (tuple): from scene, action and to scene.
+            duration (float): seconds between the action and the screen reacting.
+        """
+        cls.load()
+        with cls.lock:
+            durations = cls.samples.setdefault(cls.key(transition), [])
+            durations.append(round(duration, 4))
+            del durations[:-cls.max_samples]
+            cls.dirty = True
+
+    @classmethod
+    def wait_time(cls, transition):
+        """Returns how long to wait for a transition.
+
+        Args:
+            transition (tuple): from scene, action and to scene.
+
+        Returns:
+            float: seconds to wait, or None while the transition is still being
+                learned or is due to be checked again.
+        """
+        cls.load()
+        key = cls.key(transition)
+        durations = cls.samples.get(key)
+        if durations is None or len(durations) < cls.min_samples:
+            return None
+        cls.uses[key] = cls.uses.get(key, 0) + 1
+        if cls.uses[key] % cls.recheck_every == 0:
+            return None
+        return max(cls.min_wait, float(numpy.percentile(durations, cls.percentile)))
+
+    @classmethod
+    def save(cls):
+        """Persists the recorded durations if new ones were recorded."""
+        if not cls.dirty:
+            return
+        with cls.lock:
+            Cache.save('transitions', cls.samples)
+            cls.dirty = False
+
+    @classmethod
+    def report(cls):
+        """Logs the learned wait of every transition."""
+        cls.load()
+        for key, durations in sorted(cls.samples.items()):
+            Logger.log_debug('Transition {}: {} samples, p{} {} ms'.format(
+                key, len(durations), cls.percentile, '%.0f' % (numpy.percentile(durations, cls.percentile) * 1000)))
@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import Future
+from util.logger import Logger
+
+class Startup(object):
+    """Runs the steps of the startup that do not depend on each other at the
+    same time, each on its own thread, and times every phase of the startup.
+    """
+
+    start_time = None
+    # name: seconds spent in the phase, in the order the phases ended
+    phases = {}
+    steps = {}
+
+    @classmethod
+    def begin(cls, start_time=None):
+        """Marks the start of the startup.
+
+        Args:
+            start_time (float, optional): time.perf_counter() of the start
+                of the process, now by default.
+        """
+        cls.start_time = time.perf_counter() if start_time is None else start_time
+        cls.phases = {}
+        cls.steps = {}
+
+    @classmethod
+    def start(cls, name, function, *args):
+        """Runs function on a background thread, its result is read with result(name).
+
+        Args:
+            name (string): name of the phase.
+            function (callable): the step.
+        """
+        future = Future()
+
+        def run():
+            start_time = time.perf_counter()
+            try:
+                result = function(*args)
+            except BaseException as e:
+                cls.phases[name] = time.perf_counter() - start_time
+                future.set_exception(e)
+                return
+            cls.phases[name] = time.perf_counter() - start_time
+            future.set_result(result)
+
+        cls.steps[name] = future
+        # daemon, so that terminating the script does not wait for a slow step
+        threading.Thread(target=run, daemon=True).start()
+
+    @classmethod
+    def result(cls, name):
+        """Waits for a step started with start and returns its result,
+        raising the exception of the step if it failed.
+        """
+        return cls.steps[name].result()
+
+    @classmethod
+    def timed(cls, name, function, *args):
+        """Runs function on the calling thread and times it as a phase."""
+        start_time = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            cls.phases[name] = cls.phases.get(name, 0) + time.perf_counter() - start_time
+
+    @classmethod
+    def record(cls, name, seconds):
+        cls.phases[name] = seconds
+
+    @classmethod
+    def report(cls, details=None):
+        """Logs the duration of the startup and of each phase. Phases overlap,
+        so their sum is larger than the total when steps ran at the same time.
+
+        Args:
+            details (dict, optional): phase name: dict of the seconds spent in
+                its sub-phases, e.g. Adb.phases for the adb phase.
+        """
+        details = details or {}
+        parts = []
+        for name, seconds in cls.phases.items():
+            part = '{} {:.2f}s'.format(name, seconds)
+            if details.get(name):
+                part += ' ({})'.format(', '.join(
+                    '{} {:.2f}s'.format(phase, sub_seconds) for phase, sub_seconds in details[name].items()))
+            parts.append(part)
+        Logger.log_info('Started in {:.2f}s: {}'.format(time.perf_counter() - cls.start_time, ', '.join(parts)))
@@ -0,0 +1,150 @@
+import cv2
+import os
+import time
+from util.logger import Logger
+
+class Templates(object):
+    """In-memory store of the asset templates, so that each PNG is decoded
+    once instead of on every find. Templates are keyed by server and name and
+    the store is emptied whenever templates of another server are requested.
+    """
+
+    server = None
+    gray_templates = {}
+    color_templates = {}
+    masks = {}
+    resized_templates = {}
+
+    @classmethod
+    def select_server(cls, server):
+        """Drops every cached template if server differs from the cached one.
+
+        Args:
+            server (string): Server of the assets, e.g. 'EN'.
+        """
+        if server != cls.server:
+            cls.clear()
+            cls.server = server
+
+    @classmethod
+    def clear(cls):
+        """Empties the store."""
+        cls.server = None
+        cls.gray_templates = {}
+        cls.color_templates = {}
+        cls.masks = {}
+        cls.resized_templates = {}
+
+    @classmethod
+    def path(cls, server, name):
+        return 'assets/{}/{}.png'.format(server, name)
+
+    @classmethod
+    def _load(cls, store, server, name, flags):
+        cls.select_server(server)
+        store = getattr(cls, store)
+        template = store.get(name)
+        if template is None:
+            template = cv2.imread(cls.path(server, name), flags)
+            if template is None:
+                return None
+            template.flags.writeable = False
+            store[name] = template
+        return template
+
+    @classmethod
+    def gray(cls, server, name):
+        """Returns the grayscale template.
+
+        Args:
+            server (string): Server of the assets.
+            name (string): Name of the image, e.g. 'goto/home'.
+
+        Returns:
+            numpy array: the template, or None if the asset does not exist.
+        """
+        return cls._load('gray_templates', server, name, cv2.IMREAD_GRAYSCALE)
+
+    @classmethod
+    def color(cls, server, name):
+        """Returns the BGR template.
+
+        Args:
+            server (string): Server of the assets.
+            name (string): Name of the image, e.g. 'goto/home'.
+
+        Returns:
+            numpy array: the template, or None if the asset does not exist.
+        """
+        return cls._load('color_templates', server, name, cv2.IMREAD_COLOR)
+
+    @classmethod
+    def resized(cls, server, name, scale, color=False, interpolation=cv2.INTER_AREA):
+        """Returns the template resized by scale, computing it only once.
+
+        Args:
+            server (string): Server of the assets.
+            name (string): Name of the image, e.g. 'goto/home'.
+            scale (float): Scaling factor.
+            color (boolean): Whether to resize the BGR or the grayscale template.
+            interpolation (int, optional): Defaults to cv2.INTER_AREA.
+
+        Returns:
+            numpy array: the resized template, or None if the asset does not exist.
+        """
+        template = cls.color(server, name) if color else cls.gray(server, name)
+        if template is None:
+            return None
+        key = (name, round(scale, 4), color, interpolation)
+        resized = cls.resized_templates.get(key)
+        if resized is None:
+            resized = cv2.resize(template, None, fx=scale, fy=scale, interpolation=interpolation)
+            resized.flags.writeable = False
+            cls.resized_templates[key] = resized
+        return resized
+
+    @classmethod
+    def mask(cls, server, name):
+        """Returns the binary mask of the template computed from its alpha channel,
+        where the transparent pixels have been blacked.
+
+        Args:
+            server (string): Server of the assets.
+            name (string): Name of the image, e.g. 'goto/home'.
+
+        Returns:
+            numpy array: the mask, or None if the asset does not exist.
+        """
+        cls.select_server(server)
+        mask = cls.masks.get(name)
+        if mask is None:
+            source = cv2.imread(cls.path(server, name), cv2.IMREAD_UNCHANGED)
+            if source is None:
+                return None
+            # split into BGRA and get A
+            alpha_channel = cv2.split(source)[3]
+            ret, mask = cv2.threshold(alpha_channel, 0, 255, cv2.THRESH_BINARY)
+            mask.flags.writeable = False
+            cls.masks[name] = mask
+        return mask
+
+    @classmethod
+    def preload(cls, server):
+        """Loads the grayscale and color form of every asset of the server.
+
+        Args:
+            server (string): Server of the assets.
+        """
+        start_time = time.perf_counter()
+        root = 'assets/{}'.format(server)
+        count = 0
+        for directory, subdirectories, files in os.walk(root):
+            for file in files:
+                if not file.endswith('.png'):
+                    continue
+                name = os.path.relpath(os.path.join(directory, file), root)[:-4].replace(os.sep, '/')
+                cls.gray(server, name)
+                cls.color(server, name)
+                count += 1
+        elapsed_time = time.perf_counter() - start_time
+        Logger.log_debug("Preloaded {} templates in {} ms.".format(count, '%.2f' % (elapsed_time * 1000)))
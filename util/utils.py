@@ -3,17 +3,27 @@ import numpy
 import time
 import struct
 import os
-import lz4.block
-from imutils import contours, grab_contours
 from datetime import datetime, timedelta
 from random import uniform, gauss, randint
-from scipy import spatial
 from util.adb import Adb
 from util.logger import Logger
+from util.cache import Cache
+from util.screencap_stream import ScreenCapStream
+from util.frame_prefetcher import FramePrefetcher
+from util.frame_buffers import FrameBuffers
+from util.frame_changes import FrameChanges
+from util.templates import Templates
+from util.roi import RoiIndex
+from util.pyramid import PyramidMatcher
+from util.probes import PixelProbes
+from util.scene import SceneClassifier
+from util.sleep_policy import SleepPolicy
+from util.game_watcher import GameWatcher
+from util.batch_input import BatchInput
 from util.config_consts import UtilConsts
-from threading import Thread
-from pponnxcr import TextSystem
-from util.exceptions import GameStuckError, GameNotRunningError, ReadOCRError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from util.exceptions import GameStuckError, GameNotRunningError, ReadOCRError, WaitTimeoutError
 
 class Region(object):
     x, y, w, h = 0, 0, 0, 0
@@ -99,6 +109,19 @@ class Utils(object):
     assets = ''
     locations = ()
     ocr = None
+    last_input_time = 0
+    # seconds taken by the most recent touches, to compare batched input with
+    touch_latencies = deque(maxlen=100)
+    frame_id = 0
+    detections = {}
+    # key of a detection: (x, y, w, h) of the only area it depends on, absent for the whole screen
+    detection_areas = {}
+    downscaled_screens = {}
+    executor = None
+    # wait label: count, total and longest duration in seconds, and timeouts of wait_until
+    wait_metrics = {}
+    max_capture_attempts = 10
+    capture_buffer = bytearray()
     record = {
         'last_touch':[None, 0],
         'last_swipe':[None, 0],
@@ -110,6 +133,9 @@ class Utils(object):
     def init_screencap_mode(cls,mode):
         consts = UtilConsts.ScreenCapMode
 
+        if mode == consts.AUTO:
+            mode = cls.select_screencap_mode()
+
         cls.screencap_mode = mode
 
         if cls.screencap_mode == consts.ASCREENCAP:
@@ -131,10 +157,87 @@ class Utils(object):
                     Logger.log_warning('Since aScreenCap is not ready, falling back to normal adb screencap')
                     Utils.useAScreenCap = False
             Adb.shell('chmod 0777 /data/local/tmp/ascreencap')
+        elif cls.screencap_mode == consts.SCREENCAP_STREAM:
+            ScreenCapStream.open()
+
+    @classmethod
+    def select_screencap_mode(cls, frames=3):
+        """Picks the fastest screencap mode that works on the connected device.
+        The choice is cached per device serial, so the benchmark only runs on the
+        first start or when the cached mode stops working.
+
+        Args:
+            frames (int, optional): Defaults to 3.
+                Number of frames timed for each mode.
+
+        Returns:
+            ScreenCapMode: the selected mode.
+        """
+        consts = UtilConsts.ScreenCapMode
+        cache = Cache.load('screencap_modes', {})
+        cached = cache.get(Adb.service)
+        if cached is not None:
+            mode = consts[cached['mode']]
+            if cls.benchmark_screencap_mode(mode, 1) is not None:
+                Logger.log_msg('Using cached screencap mode {} for {}.'.format(mode.name, Adb.service))
+                return mode
+            Logger.log_warning('Cached screencap mode {} failed, benchmarking again...'.format(mode.name))
+
+        Logger.log_msg('Benchmarking screencap modes...')
+        timings = {}
+        for mode in [consts.SCREENCAP_STREAM, consts.SCREENCAP_RAW, consts.ASCREENCAP,
+                     consts.UIAUTOMATOR2, consts.SCREENCAP_PNG]:
+            elapsed_time = cls.benchmark_screencap_mode(mode, frames)
+            if elapsed_time is None:
+                Logger.log_msg('{} is not available.'.format(mode.name))
+                continue
+            Logger.log_msg('{} took {} ms per frame.'.format(mode.name, '%.2f' % (elapsed_time * 1000)))
+            timings[mode.name] = elapsed_time
+        if not timings:
+            raise Exception('No screencap mode was able to capture the screen')
+
+        mode = consts[min(timings, key=timings.get)]
+        Logger.log_success('Selected screencap mode {}.'.format(mode.name))
+        cache[Adb.service] = {'mode': mode.name, 'timings': timings}
+        Cache.save('screencap_modes', cache)
+        return mode
+
+    @classmethod
+    def benchmark_screencap_mode(cls, mode, frames):
+        """Times a screencap mode and checks that it decodes to a 1280x720 frame.
+
+        Args:
+            mode (ScreenCapMode): mode to benchmark.
+            frames (int): number of frames to time.
+
+        Returns:
+            float: median seconds per frame, or None if the mode did not work.
+        """
+        consts = UtilConsts.ScreenCapMode
+        try:
+            cls.init_screencap_mode(mode)
+            # the first frame pays for warm up costs such as opening the stream
+            cls.capture_color_screen()
+            timings = []
+            for i in range(frames):
+                start_time = time.perf_counter()
+                color_screen = cls.capture_color_screen()
+                timings.append(time.perf_counter() - start_time)
+                if color_screen.shape != (720, 1280, 3):
+                    return None
+        except Exception as e:
+            Logger.log_debug('{} failed: {}'.format(mode.name, e))
+            return None
+        finally:
+            if mode == consts.SCREENCAP_STREAM:
+                ScreenCapStream.close()
+        return sorted(timings)[len(timings) // 2]
 
     @classmethod
     def init_ocr_mode(cls, EN=None):
         # https://github.com/hgjazhgj/pponnxcr
+        # imported here as it loads onnxruntime, which is slow to import
+        from pponnxcr import TextSystem
         if EN:
             cls.ocr = TextSystem('en')
         else:
@@ -147,17 +250,26 @@ class Utils(object):
             cls.ocr = TextSystem(server_to_ocr[cls.assets])
 
     @staticmethod
-    def reposition_byte_pointer(byteArray):
+    def reposition_byte_pointer(byteArray, end=None):
         """Method to return the sanitized version of ascreencap stdout for devices
             that suffers from linker warnings. The correct pointer location will be saved
             for subsequent screen refreshes
+
+        Args:
+            byteArray (bytes-like): ascreencap stdout.
+            end (int, optional): Number of valid bytes in byteArray.
+
+        Returns:
+            memoryview: view of byteArray starting at the aScreenCap header.
         """
         global bytepointer
-        while(byteArray[bytepointer:bytepointer + 4] != b'BMZ1'):
-            bytepointer += 1
-            if bytepointer >= len(byteArray):
+        end = len(byteArray) if end is None else end
+        if byteArray[bytepointer:bytepointer + 4] != b'BMZ1':
+            bytepointer = byteArray.find(b'BMZ1', 0, end)
+            if bytepointer == -1:
+                bytepointer = 0
                 raise Exception('Repositioning byte pointer failed, corrupted aScreenCap data received')
-        return byteArray[bytepointer:]
+        return memoryview(byteArray)[bytepointer:end]
 
     @staticmethod
     def multithreader(threads):
@@ -193,19 +305,91 @@ class Utils(object):
             time.sleep(uniform(base, base + flex))
 
     @classmethod
-    def update_screen(cls):
+    def update_screen(cls, newer_than=0):
         """Uses ADB to pull a screenshot of the device and then read it via CV2
         and then stores the images in grayscale and color to screen and color_screen, respectively.
+        If the frame prefetcher is running, the freshest prefetched frame captured after
+        both newer_than and the last input is used instead. Every new frame is compared
+        with the previous one, and if it changed it gets a new frame_id and drops the
+        memoised detections that depend on the areas that changed.
+
+        Args:
+            newer_than (float, optional): time.perf_counter() timestamp the frame
+                capture must have started after when prefetching.
+        """
+        global screen
+        if FramePrefetcher.running:
+            newer_than = max(newer_than, cls.last_input_time)
+            color_screen, screen = FramePrefetcher.get_frame(newer_than)[1:]
+        else:
+            color_screen, screen = cls.capture_frame()
+        if color_screen is not cls.color_screen and FrameChanges.update(color_screen):
+            cls.frame_id += 1
+            cls.invalidate_detections()
+            cls.downscaled_screens = {}
+        cls.color_screen = color_screen
+        cls.screen = screen
+
+    @classmethod
+    def invalidate_detections(cls):
+        """Drops the memoised detections made on an area of the screen that
+        changed with the last frame."""
+        detections, areas = cls.detections, cls.detection_areas
+        cls.detections, cls.detection_areas = {}, {}
+        for key, value in detections.items():
+            area = areas.get(key)
+            if area is not None and not FrameChanges.changed(*area):
+                cls.detections[key] = value
+                cls.detection_areas[key] = area
+
+    @classmethod
+    def screen_changed(cls, region=None):
+        """Whether the last update_screen changed the screen.
+
+        Args:
+            region (Region, optional): only check this part of the screen.
 
         Returns:
-            image: A CV2 image object containing the current device screen.
+            bool: True if the screen, or the region, differs from the last frame
+                that changed it.
+        """
+        if region is None:
+            return FrameChanges.changed()
+        return FrameChanges.changed(region.x, region.y, region.w, region.h)
+
+    @classmethod
+    def changed_regions(cls):
+        """Returns the Regions of the screen that changed with the last update_screen."""
+        return [Region(*box) for box in FrameChanges.regions]
+
+    @classmethod
+    def capture_frame(cls):
+        """Captures a frame and converts it to grayscale.
+
+        Returns:
+            tuple: CV2 images of the current device screen in BGR and grayscale.
+        """
+        color_screen = cls.capture_color_screen()
+        return color_screen, FrameBuffers.gray(color_screen)
+
+    @classmethod
+    def capture_color_screen(cls):
+        """Uses ADB to pull a screenshot of the device with the configured screencap mode
+        and then read it via CV2.
+
+        Returns:
+            image: A CV2 image object in BGR format containing the current device screen.
         """
         consts = UtilConsts.ScreenCapMode
 
-        global screen
-        screen = None
+        # frames still in use must not be overwritten by the preallocated decode path
+        busy = [cls.color_screen] + FramePrefetcher.held_frames()
         color_screen = None
+        attempts = 0
         while color_screen is None:
+            if attempts == cls.max_capture_attempts:
+                raise Exception('Unable to capture the screen after {} attempts'.format(attempts))
+            attempts += 1
             if Adb.legacy:
                 color_screen = cv2.imdecode(
                     numpy.fromstring(Adb.exec_out(r"screencap -p | sed s/\r\n/\n/"), dtype=numpy.uint8),
@@ -221,19 +405,19 @@ class Utils(object):
                     start_time = time.perf_counter()
                     pixel_size = 4
 
-                    byte_arr = Adb.exec_out('screencap')
+                    length = Adb.exec_out_into('screencap', cls.capture_buffer)
                     header_format = 'III'
                     header_size = struct.calcsize(header_format)
-                    if len(byte_arr) < header_size:
+                    if length < header_size:
                         continue
-                    header = struct.unpack(header_format, byte_arr[:header_size])
+                    header = struct.unpack_from(header_format, cls.capture_buffer)
                     width = header[0]
                     height = header[1]
-                    if len(byte_arr) != header_size + width * height * pixel_size:
+                    # Android 9 and newer append the colour space to the header
+                    header_size = length - width * height * pixel_size
+                    if header_size not in (12, 16):
                         continue
-                    tmp = numpy.frombuffer(byte_arr, dtype=numpy.uint8, count=width * height * 4, offset=header_size)
-                    rgb_img = tmp.reshape((height, width, -1))
-                    color_screen = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2BGR)
+                    color_screen = FrameBuffers.decode_rgba(cls.capture_buffer, header_size, width, height, busy)
                     elapsed_time = time.perf_counter() - start_time
                     Logger.log_debug("SCREENCAP_RAW took {} ms to complete.".format('%.2f' % (elapsed_time * 1000)))
                 elif cls.screencap_mode == consts.UIAUTOMATOR2:
@@ -242,9 +426,11 @@ class Utils(object):
                     elapsed_time = time.perf_counter() - start_time
                     Logger.log_debug("uiautomator2 took {} ms to complete.".format('%.2f' % (elapsed_time * 1000)))
                 elif cls.screencap_mode == consts.ASCREENCAP:
+                    # only aScreenCap frames are compressed, so only this mode needs lz4
+                    import lz4.block
                     start_time = time.perf_counter()
-                    raw_compressed_data = Utils.reposition_byte_pointer(
-                        Adb.exec_out('/data/local/tmp/ascreencap --pack 2 --stdout'))
+                    length = Adb.exec_out_into('/data/local/tmp/ascreencap --pack 2 --stdout', cls.capture_buffer)
+                    raw_compressed_data = Utils.reposition_byte_pointer(cls.capture_buffer, length)
                     compressed_data_header = numpy.frombuffer(raw_compressed_data[0:20], dtype=numpy.uint32)
                     if compressed_data_header[0] != 828001602:
                         compressed_data_header = compressed_data_header.byteswap()
@@ -254,17 +440,25 @@ class Utils(object):
                                 'aScreenCap header verification failure, corrupted image received. HEADER IN HEX = {}'.format(
                                     compressed_data_header.tobytes().hex()))
                     uncompressed_data_size = compressed_data_header[1].item()
-                    color_screen = cv2.imdecode(numpy.frombuffer(
-                        lz4.block.decompress(raw_compressed_data[20:], uncompressed_size=uncompressed_data_size),
-                        dtype=numpy.uint8), cv2.IMREAD_COLOR)
+                    color_screen = FrameBuffers.decode_bmp(
+                        lz4.block.decompress(raw_compressed_data[20:], uncompressed_size=uncompressed_data_size), busy)
                     elapsed_time = time.perf_counter() - start_time
                     Logger.log_debug("aScreenCap took {} ms to complete.".format('%.2f' % (elapsed_time * 1000)))
+                elif cls.screencap_mode == consts.SCREENCAP_STREAM:
+                    start_time = time.perf_counter()
+                    width, height, pixels = ScreenCapStream.read_frame()
+                    color_screen = FrameBuffers.decode_rgba(pixels, 0, width, height, busy)
+                    elapsed_time = time.perf_counter() - start_time
+                    Logger.log_debug("SCREENCAP_STREAM took {} ms to complete (average frame latency {} ms).".format(
+                        '%.2f' % (elapsed_time * 1000), '%.2f' % (ScreenCapStream.average_latency() * 1000)))
                 else:
                     raise Exception('Unknown screencap mode')
+        return color_screen
 
-            screen = cv2.cvtColor(color_screen, cv2.COLOR_BGR2GRAY)
-            cls.color_screen = color_screen
-            cls.screen = screen
+    @classmethod
+    def start_prefetcher(cls):
+        """Starts capturing frames in the background, see FramePrefetcher."""
+        FramePrefetcher.start(cls.capture_frame)
 
     @classmethod
     def wait_update_screen(cls, time=None):
@@ -273,11 +467,96 @@ class Utils(object):
         Args:
             time (int, optional): seconds of delay.
         """
+        # frames captured after the minimum delay are as good as one captured after the sleep
+        newer_than = cls.timestamp() + (0.4 if time is None else time)
         if time is None:
             cls.script_sleep()
         else:
             cls.script_sleep(time)
-        cls.update_screen()
+        cls.update_screen(newer_than)
+
+    @classmethod
+    def wait_until(cls, predicate, timeout=10, poll=0.1, backoff=1.5, max_poll=0.5, label='wait',
+                   raise_on_timeout=True):
+        """Updates the screen as fast as the capture allows until predicate
+        holds. The delay between two captures starts at poll and grows by
+        backoff up to max_poll, and frames that did not change keep their
+        memoised detections, so checking the predicate again is cheap.
+
+        Args:
+            predicate (function): called after every capture, e.g.
+                lambda: Utils.find('goto/home'). The wait ends when it returns
+                a truthy value.
+            timeout (float, optional): seconds to wait at most.
+            poll (float, optional): seconds between the first captures.
+            backoff (float, optional): factor the delay grows by after every capture.
+            max_poll (float, optional): longest delay between two captures.
+            label (string, optional): name the wait is recorded under in wait_metrics.
+            raise_on_timeout (boolean, optional): whether to raise WaitTimeoutError
+                when the timeout expires, instead of returning the last value.
+
+        Returns:
+            the value returned by predicate.
+        """
+        start_time = cls.timestamp()
+        delay = poll
+        while True:
+            cls.update_screen()
+            result = predicate()
+            elapsed_time = cls.timestamp() - start_time
+            if result or elapsed_time >= timeout:
+                break
+            time.sleep(min(delay, timeout - elapsed_time))
+            delay = min(delay * backoff, max_poll)
+
+        metrics = cls.wait_metrics.setdefault(label, {'count': 0, 'total': 0, 'max': 0, 'timeouts': 0})
+        metrics['count'] += 1
+        metrics['total'] += elapsed_time
+        metrics['max'] = max(metrics['max'], elapsed_time)
+        if not result:
+            metrics['timeouts'] += 1
+            if raise_on_timeout:
+                raise WaitTimeoutError('{} did not complete within {} seconds'.format(label, timeout))
+        return result
+
+    @classmethod
+    def settle(cls, transition, region, default):
+        """Waits for the screen to react to the action just made. While the
+        transition is being learned, and now and then afterwards, the screen is
+        watched until the region changes and the time it took is recorded, a
+        wait that times out counts as default. Otherwise the SleepPolicy wait
+        is slept without capturing.
+
+        Args:
+            transition (tuple): from scene, action and to scene, e.g.
+                ('sweep', 'plus', 'sweep').
+            region (Region): part of the screen the action changes.
+            default (float): seconds to watch the region for at most.
+        """
+        wait = SleepPolicy.wait_time(transition)
+        if wait is not None:
+            time.sleep(wait)
+            return
+        start_time = cls.last_input_time
+        if cls.wait_until(lambda: cls.screen_changed(region), timeout=default, poll=0.05,
+                          label=SleepPolicy.key(transition), raise_on_timeout=False):
+            SleepPolicy.record(transition, cls.timestamp() - start_time)
+        else:
+            # leaving timeouts out would learn the fast transitions only
+            SleepPolicy.record(transition, default)
+
+    @classmethod
+    def wait_report(cls):
+        """Logs how long the waits of every label took."""
+        for label, metrics in sorted(cls.wait_metrics.items()):
+            Logger.log_debug('Wait {}: {} waits, {} ms on average, {} ms at most, {} timeouts'.format(
+                label, metrics['count'], '%.0f' % (metrics['total'] * 1000 / metrics['count']),
+                '%.0f' % (metrics['max'] * 1000), metrics['timeouts']))
+
+    @staticmethod
+    def timestamp():
+        """Returns the current time.perf_counter() value."""
+        return time.perf_counter()
 
     @staticmethod
     def get_color_screen():
@@ -307,11 +586,7 @@ class Utils(object):
         Returns:
             mask (numpy array): binary image obtained from the source image's alpha channel.
         """
-        source = cv2.imread('assets/{}/{}.png'.format(cls.assets, image), cv2.IMREAD_UNCHANGED)
-        # split into BGRA and get A
-        alpha_channel = cv2.split(source)[3]
-        ret, thresh = cv2.threshold(alpha_channel, 0, 255, cv2.THRESH_BINARY)
-        return thresh
+        return Templates.mask(cls.assets, image)
 
     @classmethod
     def show_on_screen(cls, coordinates):
@@ -354,15 +629,194 @@ class Utils(object):
             Region: region object containing the location and size of the image
         """
         Utils.check_game_status()
+        key = ('find', image, similarity, color)
+        if key not in cls.detections:
+            cls.memoise(key, *cls.search(image, similarity, color))
+        return cls.detections[key]
+
+    @classmethod
+    def find_many(cls, images, similarity=DEFAULT_SIMILARITY, color=False):
+        """Finds several images on the same screen in one call. The template
+        matches run concurrently on the worker pool, as OpenCV releases the GIL,
+        and the results are memoised for the current frame like find's.
+
+        Args:
+            images (list): Names of the images. An entry can also be a tuple
+                (name, color) to override color for that image.
+            similarity (float, optional): Defaults to DEFAULT_SIMILARITY.
+                Percentage in similarity that the images should at least match.
+            color (boolean): find the images in color screen
+
+        Returns:
+            dict: Region or None for each image name.
+        """
+        Utils.check_game_status()
+        pending = {}
+        for entry in images:
+            image, image_color = entry if isinstance(entry, tuple) else (entry, color)
+            key = ('find', image, similarity, image_color)
+            if key not in cls.detections and key not in pending:
+                pending[key] = cls.get_executor().submit(cls.search, image, similarity, image_color)
+        for key, future in pending.items():
+            cls.memoise(key, *future.result())
+
+        results = {}
+        for entry in images:
+            image, image_color = entry if isinstance(entry, tuple) else (entry, color)
+            results[image] = cls.detections[('find', image, similarity, image_color)]
+        return results
+
+    @classmethod
+    def memoise(cls, key, value, area=None):
+        """Memoises a detection on the current frame.
+
+        Args:
+            key (tuple): key of the detection.
+            value: result of the detection.
+            area (tuple, optional): (x, y, w, h) of the only part of the screen
+                the result depends on, the whole screen if omitted.
+        """
+        cls.detections[key] = value
+        if area is not None:
+            cls.detection_areas[key] = area
+
+    @classmethod
+    def classify_scene(cls):
+        """Classifies the current screen with the SceneClassifier, once per frame.
+
+        Returns:
+            tuple: scene label, or None if unsure, and confidence.
+        """
+        Utils.check_game_status()
+        key = ('scene',)
+        if key not in cls.detections:
+            cls.memoise(key, SceneClassifier.classify(cls.assets, cls.color_screen))
+        return cls.detections[key]
+
+    @classmethod
+    def get_executor(cls):
+        """Returns the worker pool shared by the matching methods, creating it on first use."""
+        if cls.executor is None:
+            cls.executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                              thread_name_prefix='matcher')
+        return cls.executor
+
+    @classmethod
+    def match(cls, image, similarity=DEFAULT_SIMILARITY, color=False):
+        """Matches the specified image against the current screen, without
+        checking the game status nor the memoised detections.
+
+        Args:
+            image (string): Name of the image.
+            similarity (float, optional): Defaults to DEFAULT_SIMILARITY.
+                Percentage in similarity that the image should at least match.
+            color (boolean): find the image in color screen
+
+        Returns:
+            Region: region object containing the location and size of the image
+        """
+        return cls.search(image, similarity, color)[0]
+
+    @classmethod
+    def search(cls, image, similarity=DEFAULT_SIMILARITY, color=False):
+        """Same as match, but also tells which part of the screen the result
+        depends on, so that it can stay memoised while that part does not change.
+
+        Returns:
+            tuple: Region or None, and the (x, y, w, h) area the result depends
+                on, or None for the whole screen.
+        """
         if color:
-            template = cv2.imread('assets/{}/{}.png'.format(cls.assets, image), cv2.IMREAD_COLOR)
-            match = cv2.matchTemplate(cls.color_screen, template, cv2.TM_CCOEFF_NORMED)
+            template = Templates.color(cls.assets, image)
+            screen_image = cls.color_screen
         else:
-            template = cv2.imread('assets/{}/{}.png'.format(cls.assets, image), 0)
-            match = cv2.matchTemplate(cls.screen, template, cv2.TM_CCOEFF_NORMED)
+            template = Templates.gray(cls.assets, image)
+            screen_image = cls.screen
+        height, width = template.shape[:2]
+
+        # screen-state templates are answered by a few pixels unless the probes are inconclusive
+        probed = image in PixelProbes.templates
+        if probed:
+            verdict, probe_region = PixelProbes.check(cls.assets, image, cls.color_screen)
+            if verdict is not None:
+                return Region(*probe_region) if verdict else None, probe_region
+
+        # search the window the template usually appears in first
+        region = None
+        window = RoiIndex.window(cls.assets, image, width, height)
+        if window is not None:
+            x, y, w, h = window
+            region = cls.match_template(screen_image[y:y + h, x:x + w], template, similarity, color, (x, y))
+            RoiIndex.count(image, region is not None)
+            if region is not None:
+                area = window
+
+        if region is None:
+            area = None
+            if image in PyramidMatcher.templates:
+                region = cls.match_pyramid(image, template, similarity, color)
+            else:
+                region = cls.match_template(screen_image, template, similarity, color)
+            if region is not None:
+                RoiIndex.learn(cls.assets, image, region.x, region.y, region.w, region.h)
+        if region is not None and probed:
+            PixelProbes.learn(cls.assets, image, cls.color_screen, region.x, region.y, region.w, region.h)
+        return region, area
+
+    @classmethod
+    def match_pyramid(cls, image, template, similarity, color):
+        """Searches the whole screen for the template with the coarse-to-fine
+        PyramidMatcher, see match_template for the exact search.
+
+        Args:
+            image (string): Name of the image.
+            template (numpy array): template of the image.
+            similarity (float): Percentage in similarity that the template should at least match.
+            color (boolean): find the image in color screen
+
+        Returns:
+            Region: region object containing the location and size of the image
+        """
+        screen_image = cls.color_screen if color else cls.screen
+        small_template = Templates.resized(cls.assets, image, PyramidMatcher.scale, color)
+        if not PyramidMatcher.usable(small_template):
+            return cls.match_template(screen_image, template, similarity, color)
+        value, location = PyramidMatcher.match_best(
+            screen_image, cls.downscaled_screen(color), template, small_template, similarity)
+        if value >= similarity and not cls.is_obscured(location, template.shape[:2], color):
+            return Region(location[0], location[1], template.shape[1], template.shape[0])
+        return None
+
+    @classmethod
+    def downscaled_screen(cls, color=False):
+        """Returns the current screen at PyramidMatcher's coarse level, computed
+        once per frame.
+
+        Args:
+            color (boolean): whether to downscale the color screen.
+        """
+        if color not in cls.downscaled_screens:
+            cls.downscaled_screens[color] = PyramidMatcher.downscale(cls.color_screen if color else cls.screen)
+        return cls.downscaled_screens[color]
+
+    @classmethod
+    def match_template(cls, screen_image, template, similarity, color, offset=(0, 0)):
+        """Returns the best match of the template in screen_image if it is good enough.
+
+        Args:
+            screen_image (numpy array): screen, or a patch of it, to search.
+            template (numpy array): template to search for.
+            similarity (float): Percentage in similarity that the template should at least match.
+            color (boolean): whether the images are in color.
+            offset (tuple, optional): screen coordinates of the top-left corner of screen_image.
 
+        Returns:
+            Region: region object containing the screen location and size of the match
+        """
         height, width = template.shape[:2]
+        match = cv2.matchTemplate(screen_image, template, cv2.TM_CCOEFF_NORMED)
         value, location = cv2.minMaxLoc(match)[1], cv2.minMaxLoc(match)[3]
+        location = (location[0] + offset[0], location[1] + offset[1])
         # Check if the template match is not obscured by comparing pixel darkness
         if value >= similarity and not cls.is_obscured(location, template.shape[:2], color):
             return Region(location[0], location[1], width, height)
@@ -413,7 +867,7 @@ class Utils(object):
         Returns:
             Region: Coordinates or where the image appears.
         """
-        template = cv2.imread('assets/{}/{}.png'.format(cls.assets, image), 0)
+        template = Templates.gray(cls.assets, image)
         # first try with default size
         width, height = template.shape[::-1]
         match = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
@@ -444,22 +898,26 @@ class Utils(object):
             l_interpolation = cv2.INTER_NEAREST
             u_interpolation = cv2.INTER_NEAREST
 
-        results_list = []
         count = 0
         loop_limiter = (middle_range - lowerEnd) * 100
 
-        thread_list = []
+        futures = []
+        executor = cls.get_executor()
         while (upperEnd > lowerEnd) and (count < loop_limiter):
-            thread_list.append(Thread(target=cls.resize_and_match, args=(results_list, template, lowerEnd, similarity, l_interpolation)))
-            thread_list.append(Thread(target=cls.resize_and_match, args=(results_list, template, upperEnd, similarity, u_interpolation)))
+            futures.append(executor.submit(cls.resize_and_match, image, lowerEnd, similarity, l_interpolation))
+            futures.append(executor.submit(cls.resize_and_match, image, upperEnd, similarity, u_interpolation))
             lowerEnd+=0.02
             upperEnd-=0.02
             count +=1
-        cls.multithreader(thread_list)
-        if results_list:
-            return results_list[0]
-        else:
-            return None
+        # the first scale that clears the similarity wins, the remaining ones are dropped
+        result = None
+        for future in as_completed(futures):
+            result = future.result()
+            if result is not None:
+                break
+        for future in futures:
+            future.cancel()
+        return result
 
     @classmethod
     def find_all(cls, image, similarity=DEFAULT_SIMILARITY, useMask=False):
@@ -476,6 +934,9 @@ class Utils(object):
         Returns:
             array: Array of all coordinates where the image appears
         """
+        key = ('find_all', image, similarity, useMask)
+        if key in cls.detections:
+            return cls.detections[key]
         del cls.locations
 
         if useMask:
@@ -485,12 +946,21 @@ class Utils(object):
             comparison_method = cv2.TM_CCOEFF_NORMED
             mask = None
 
-        template = cv2.imread('assets/{}/{}.png'.format(cls.assets, image), 0)
-        match = cv2.matchTemplate(screen, template, comparison_method, mask=mask)
-        cls.locations = numpy.where(match >= similarity)
+        template = Templates.gray(cls.assets, image)
+        small_template = None
+        if image in PyramidMatcher.templates and not useMask:
+            small_template = Templates.resized(cls.assets, image, PyramidMatcher.scale)
+        if small_template is not None and PyramidMatcher.usable(small_template):
+            cls.locations = PyramidMatcher.match_all(
+                screen, cls.downscaled_screen(), template, small_template, similarity)
+        else:
+            match = cv2.matchTemplate(screen, template, comparison_method, mask=mask)
+            cls.locations = numpy.where(match >= similarity)
 
-        return cls.filter_similar_coords(
+        coords = cls.filter_similar_coords(
             list(zip(cls.locations[1], cls.locations[0])))
+        cls.memoise(key, coords)
+        return coords
 
     @classmethod
     def find_all_with_resize(cls, image, similarity=DEFAULT_SIMILARITY, useMask=False):
@@ -519,42 +989,42 @@ class Utils(object):
             comparison_method = cv2.TM_CCOEFF_NORMED
             mask = None
 
-        template = cv2.imread('assets/{}/{}.png'.format(cls.assets, image), 0)
+        template = Templates.gray(cls.assets, image)
         match = cv2.matchTemplate(screen, template, comparison_method, mask=mask)
         cls.locations = numpy.where(match >= similarity)
 
         if len(cls.locations[0]) < 1:
             count = 1.20
-            thread_list = []
-            results_list = []
+            futures = []
+            executor = cls.get_executor()
             while count > 0.80:
-                thread_list.append(Thread(target=cls.match_resize, args=(results_list,template,count,comparison_method,similarity,useMask,mask)))
+                futures.append(executor.submit(cls.match_resize, image, count, comparison_method, similarity, useMask, mask))
                 count -= 0.02
-            Utils.multithreader(thread_list)
-            for i in range(0, len(results_list)):
-                cls.locations = numpy.append(cls.locations, results_list[i], axis=1)
+            for future in futures:
+                cls.locations = numpy.append(cls.locations, future.result(), axis=1)
 
         return cls.filter_similar_coords(
             list(zip(cls.locations[1], cls.locations[0])))
 
     @classmethod
-    def match_resize(cls, results_list, image, scale, comparison_method, similarity=DEFAULT_SIMILARITY, useMask=False, mask=None):
-        template_resize = cv2.resize(image, None, fx = scale, fy = scale, interpolation = cv2.INTER_NEAREST)
+    def match_resize(cls, image, scale, comparison_method, similarity=DEFAULT_SIMILARITY, useMask=False, mask=None):
+        template_resize = Templates.resized(cls.assets, image, scale, interpolation=cv2.INTER_NEAREST)
         if useMask:
             mask_resize = cv2.resize(mask, None, fx = scale, fy = scale, interpolation = cv2.INTER_NEAREST)
         else:
             mask_resize = None
         match_resize = cv2.matchTemplate(screen, template_resize, comparison_method, mask=mask_resize)
-        results_list.append(numpy.where(match_resize >= similarity))
+        return numpy.where(match_resize >= similarity)
 
     @classmethod
-    def resize_and_match(cls, results_list, templateImage, scale, similarity=DEFAULT_SIMILARITY, interpolationMethod=cv2.INTER_NEAREST):
-        template_resize = cv2.resize(templateImage, None, fx = scale, fy = scale, interpolation = interpolationMethod)
+    def resize_and_match(cls, image, scale, similarity=DEFAULT_SIMILARITY, interpolationMethod=cv2.INTER_NEAREST):
+        template_resize = Templates.resized(cls.assets, image, scale, interpolation=interpolationMethod)
         width, height = template_resize.shape[::-1]
         match = cv2.matchTemplate(screen, template_resize, cv2.TM_CCOEFF_NORMED)
         value, location = cv2.minMaxLoc(match)[1], cv2.minMaxLoc(match)[3]
         if (value >= similarity):
-            results_list.append(Region(location[0], location[1], width, height))
+            return Region(location[0], location[1], width, height)
+        return None
 
     @classmethod
     def touch(cls, x, y):
@@ -576,8 +1046,59 @@ class Utils(object):
             last_touch = [(x, y), 0]
 
         cls.record['last_touch'] = last_touch
+        start_time = time.perf_counter()
         Utils.check_game_status()
         Adb.u2device.click(x, y)
+        cls.last_input_time = time.perf_counter()
+        cls.touch_latencies.append(cls.last_input_time - start_time)
+
+    @classmethod
+    def batch_input(cls, events, delay=0.02):
+        """Sends a series of taps and swipes to the device in one command, see
+        BatchInput. Unlike touch and swipe, the events are not checked for a
+        stuck game one by one. If monkey fails to run them, they are sent
+        again one at a time with touch and swipe.
+
+        Args:
+            events (list): ('tap', x, y), ('swipe', x1, y1, x2, y2, ms) and
+                ('wait', seconds) tuples.
+            delay (float, optional): seconds to wait after every tap and swipe.
+
+        Returns:
+            float: wall time in seconds.
+        """
+        Utils.check_game_status()
+        try:
+            elapsed_time = BatchInput.send(events, delay)
+        except Exception as e:
+            Logger.log_warning('Batched input failed, sending the events one at a time: {}'.format(e))
+            return cls.send_events(events, delay)
+        cls.last_input_time = time.perf_counter()
+        message = 'Sent {} input events in {} s'.format(len(events), '%.2f' % elapsed_time)
+        if cls.touch_latencies:
+            touch_latency = sum(cls.touch_latencies) / len(cls.touch_latencies)
+            message += ', about {} s one touch at a time'.format('%.2f' % (touch_latency * len(events)))
+        Logger.log_debug(message + '.')
+        return elapsed_time
+
+    @classmethod
+    def send_events(cls, events, delay):
+        """Sends the events of a batch one at a time, see batch_input.
+
+        Returns:
+            float: wall time in seconds.
+        """
+        start_time = time.perf_counter()
+        for event in events:
+            if event[0] == 'tap':
+                cls.touch(event[1], event[2])
+            elif event[0] == 'swipe':
+                cls.swipe(*event[1:])
+            else:
+                time.sleep(event[1])
+                continue
+            time.sleep(delay)
+        return time.perf_counter() - start_time
 
     @classmethod
     def touch_randomly(cls, region=Region(0, 0, 1280, 720)):
@@ -616,6 +1137,7 @@ class Utils(object):
         cls.record['last_swipe'] = last_swipe
         Utils.check_game_status()
         Adb.u2device.swipe(x1, y1, x2, y2, ms)
+        cls.last_input_time = time.perf_counter()
 
     @classmethod
     def find_and_touch(cls, image, similarity=DEFAULT_SIMILARITY, color=False):
@@ -668,7 +1190,11 @@ class Utils(object):
 
     @classmethod
     def filter_similar_coords(cls, coords, distance=50):
-        """Filters out coordinates that are close to each other.
+        """Filters out coordinates that are close to each other. Coordinates are
+        visited in order and kept only if no previously kept coordinate lies
+        within distance. Every kept coordinate suppresses all the later ones
+        around it in a single vectorised step, so dense match maps with
+        thousands of raw hits are filtered in a few milliseconds.
 
         Args:
             coords (array): An array containing the coordinates to be filtered.
@@ -681,17 +1207,26 @@ class Utils(object):
         #Logger.log_debug("Coords: " + str(coords))
         filtered_coords = []
         if len(coords) > 0:
-            filtered_coords.append(coords[0])
-            for coord in coords:
-                if cls.find_closest(filtered_coords, coord)[0] > distance:
-                    filtered_coords.append(coord)
+            points = numpy.asarray(coords, dtype=numpy.int64).reshape(-1, 2)
+            alive = numpy.ones(len(points), dtype=bool)
+            limit = distance * distance
+            index = 0
+            while index < len(points):
+                filtered_coords.append(coords[index])
+                rest = points[index + 1:]
+                delta = rest - points[index]
+                alive[index + 1:] &= (delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]) > limit
+                remaining = numpy.flatnonzero(alive[index + 1:])
+                if len(remaining) == 0:
+                    break
+                index += 1 + remaining[0]
         Logger.log_debug("Filtered Coords: " + str(filtered_coords))
         return filtered_coords
 
     @staticmethod
     def find_closest(coords, coord):
-        """Utilizes a k-d tree to find the closest coordiante to the specified
-        list of coordinates.
+        """Finds the closest coordinate to the specified one in the list of
+        coordinates.
 
         Args:
             coords (array): Array of coordinates to search.
@@ -702,7 +1237,10 @@ class Utils(object):
             in the list of coordinates to the specified coordinate as well the
             index of where it is in the list of coordinates
         """
-        return spatial.cKDTree(coords).query(coord)
+        points = numpy.asarray(coords, dtype=numpy.float64).reshape(-1, 2)
+        distances = numpy.hypot(points[:, 0] - coord[0], points[:, 1] - coord[1])
+        index = int(numpy.argmin(distances))
+        return distances[index], index
 
     @classmethod
     def get_region_color_average(cls, region, hsv=True):
@@ -729,9 +1267,15 @@ class Utils(object):
 
     @classmethod
     def check_game_status(cls):
-        """Check if the game is running; raise an exception if not."""
-        if Adb.u2device.app_current()['package'] != 'com.nexon.bluearchive':
-            raise GameNotRunningError
+        """Check if the game is running; raise an exception if not. While the
+        GameWatcher runs, its cached status is trusted when the game is in the
+        foreground, otherwise the device is asked before raising.
+        """
+        if not GameWatcher.game_running():
+            package = Adb.u2device.app_current()['package']
+            GameWatcher.foreground = package
+            if package != GameWatcher.package:
+                raise GameNotRunningError
         cls.record['game_started'] = True
 
     @classmethod
@@ -747,6 +1291,9 @@ class Utils(object):
         Returns:
             list: A list of scan results.
         """
+        key = ('scan', region.x, region.y, region.w, region.h, resize, color, bbox, id(cls.ocr))
+        if key in cls.detections:
+            return cls.detections[key]
         results = []
         crop = cls.color_screen[region.y:region.y + region.h, region.x:region.x + region.w]
         if resize:
@@ -767,6 +1314,7 @@ class Utils(object):
                 results.append({'bbox': adjusted_bbox, 'text': entry.ocr_text, 'score': entry.score})
             else:
                 results.append({'text': entry.ocr_text, 'score': entry.score})
+        cls.memoise(key, results, (region.x, region.y, region.w, region.h))
         return results
 
     @classmethod
@@ -802,7 +1350,7 @@ class Utils(object):
         Returns:
             Region: The region of the found button.
         """
-        button = cv2.imread('assets/{}/{}.png'.format(Utils.assets, button), 0)
+        button = Templates.gray(Utils.assets, button)
         search_region_height = stage_region.h - text_region.h
         if button.shape[0] > abs(search_region_height):
             button = button[:search_region_height, :]
@@ -885,13 +1433,13 @@ class Utils(object):
                 else:
                     for i in range(num - current):
                         cls.touch(*plus)
-                        time.sleep(0.7)
+                        cls.settle(('sweep', 'plus', 'sweep'), counter, 0.7)
                     last_current = current
                     continue
             if current > num:
                 for i in range(current - num):
                     cls.touch(*minus)
-                    time.sleep(0.7)
+                    cls.settle(('sweep', 'minus', 'sweep'), counter, 0.7)
                 last_current = current
                 continue
             if current == num:
@@ -926,19 +1474,79 @@ class GoTo(object):
         'tactical_challenge': {'click_position':(1100,500), 'template':'goto/tactical_challenge'}
     }
 
+    # seconds to wait for the screen to react to a touch before touching again
+    navigation_timeout = 2
+
     home_button = (1235, 21)
     back_button = (55,40)
     skip_confirm_button = (765, 500)
     wake_up_coords = (475, 20) # coords to touch to show widgets/skip lobby in the homescreen
     
+    # scene label: template and colour find looks for when the scene classifier is unsure
+    scene_templates = {
+        'home': ('goto/home', True),
+        'campaign': ('goto/campaign', True),
+        'event': ('goto/event', True),
+        'skip': ('goto/skip', False)
+    }
+    scene_templates.update({section: (entry['template'], True)
+                            for section, entry in {**home_subsections, **campaign_subsections}.items()})
+
+    @classmethod
+    def where(cls, scenes):
+        """Tells which of the scenes the current screen shows. The scene
+        classifier answers in one pass and its answer is confirmed with the
+        template of the scene, which is cheap inside its learned window. If
+        the classifier is unsure or wrong, the templates of the scenes are
+        matched in one find_many and the first found, in the given order, is
+        returned.
+
+        Args:
+            scenes (list): Labels of the scenes, see SceneClassifier.anchors.
+
+        Returns:
+            str: label of the scene, or None if the screen shows none of them.
+        """
+        scene = Utils.classify_scene()[0]
+        if scene in scenes:
+            image, color = cls.scene_templates[scene]
+            if Utils.find(image, color=color):
+                return scene
+        Utils.find_many([cls.scene_templates[scene] for scene in scenes])
+        for scene in scenes:
+            image, color = cls.scene_templates[scene]
+            if Utils.find(image, color=color):
+                return scene
+        return None
+
+    @classmethod
+    def wait_for_scene(cls, scenes, previous=None):
+        """Waits until the screen shows one of the scenes other than previous,
+        so that the next touch is only made once the last one took effect.
+
+        Args:
+            scenes (list): Labels of the scenes, see where.
+            previous (str, optional): scene shown before the last touch.
+
+        Returns:
+            str: the scene shown when the wait ended, None if none of them.
+        """
+        def new_scene():
+            scene = cls.where(scenes)
+            return scene if scene != previous else None
+        scene = Utils.wait_until(new_scene, timeout=cls.navigation_timeout,
+                                 label='goto', raise_on_timeout=False)
+        return scene or cls.where(scenes)
+
     @classmethod
     def home(cls):
         """Navigate to the home screen."""
+        scene = None
         while True:
-            Utils.wait_update_screen(1)
-            if Utils.find('goto/home', color=True):
+            scene = cls.wait_for_scene(['home', 'skip'], scene)
+            if scene == 'home':
                 break
-            elif Utils.find('goto/skip'):
+            elif scene == 'skip':
                 Utils.touch(*cls.skip_confirm_button)
             else:
                 Utils.touch(*cls.home_button)
@@ -951,13 +1559,14 @@ class GoTo(object):
             section (str): The name of the subsection.
         """
         waiting_time = 0
+        scene = None
         while True:
-            Utils.wait_update_screen(1)
-            if Utils.find(cls.home_subsections[section]['template'], color=True):
+            scene = cls.wait_for_scene([section, 'home', 'skip'], scene)
+            if scene == section:
                 break
-            elif Utils.find('goto/home', color=True):
+            elif scene == 'home':
                 Utils.touch(*cls.home_subsections[section]['click_position'])
-            elif Utils.find('goto/skip'):
+            elif scene == 'skip':
                 Utils.touch(*cls.skip_confirm_button)
             elif waiting_time < 5 and not Utils.find('goto/settings'):
                 Utils.touch(*cls.wake_up_coords)
@@ -977,15 +1586,16 @@ class GoTo(object):
             section (str): The name of the subsection.
         """
         waiting_time = 0
+        scene = None
         while True:
-            Utils.wait_update_screen(1)
-            if Utils.find(cls.campaign_subsections[section]['template'], color=True):
+            scene = cls.wait_for_scene([section, 'campaign', 'home', 'skip'], scene)
+            if scene == section:
                 break
-            elif Utils.find('goto/campaign', color=True):
+            elif scene == 'campaign':
                 Utils.touch(*cls.campaign_subsections[section]['click_position'])
-            elif Utils.find('goto/home', color=True):
+            elif scene == 'home':
                 cls.sub_home('campaign')
-            elif Utils.find('goto/skip'):
+            elif scene == 'skip':
                 Utils.touch(*cls.skip_confirm_button)
             elif waiting_time < 5 and not Utils.find('goto/settings'):
                 Utils.touch(*cls.wake_up_coords)
@@ -1001,17 +1611,18 @@ class GoTo(object):
     @classmethod
     def event(cls):
         waiting_time = 0
+        scene = None
         while True:
-            Utils.wait_update_screen(1)
-            if Utils.find('goto/event', color=True):
+            scene = cls.wait_for_scene(['event', 'campaign', 'home', 'skip'], scene)
+            if scene == 'event':
                 break
             elif Utils.find_and_touch('goto/event_banner'):
                 continue
-            elif Utils.find("goto/campaign", color=True):
+            elif scene == 'campaign':
                 Utils.swipe(40,160, 260, 40)
-            elif Utils.find('goto/home', color=True):
+            elif scene == 'home':
                 cls.sub_home('campaign')
-            elif Utils.find('goto/skip'):
+            elif scene == 'skip':
                 Utils.touch(*cls.skip_confirm_button)
             elif waiting_time < 5 and not Utils.find('goto/settings'):
                 Utils.touch(*cls.wake_up_coords)